@@ -1,20 +1,30 @@
 #!/usr/bin/env python3
 
-import itertools as it, operator as op, functools as ft, datetime as dt
+import itertools as it, operator as op, functools as ft, datetime as dt, copy
 import pathlib as pl, collections as cs, dataclasses as dc
-import os, sys, re, logging, enum, textwrap, random, signal
-
-import gi
-gi.require_version('Gtk', '3.0')
-gi.require_version('Gdk', '3.0')
-gi.require_version('GLib', '2.0')
-gi.require_version('GdkPixbuf', '2.0')
-from gi.repository import Gtk, Gdk, GdkPixbuf, GLib
-
-try:
-	from gi.repository import GLibUnix
-	glib_signal_add = GLibUnix.signal_add
-except ImportError: glib_signal_add = GLib.unix_signal_add # deprecated
+import os, sys, re, logging, enum, textwrap, random, signal, math, time, threading, bisect
+
+
+# GTK modules and classes derived from these are only set by gtk_import(),
+#  so that --help, --conf-dump and such don't need to load these at all
+Gtk = Gdk = GdkPixbuf = GLib = glib_signal_add = None
+ScrollerWindow = ScrollerApp = None
+
+def gtk_import():
+	global Gtk, Gdk, GdkPixbuf, GLib, glib_signal_add, ScrollerWindow, ScrollerApp
+	if Gtk: return
+	import gi
+	gi.require_version('Gtk', '3.0')
+	gi.require_version('Gdk', '3.0')
+	gi.require_version('GLib', '2.0')
+	gi.require_version('GdkPixbuf', '2.0')
+	from gi.repository import Gtk, Gdk, GdkPixbuf, GLib
+	try:
+		from gi.repository import GLibUnix
+		glib_signal_add = GLibUnix.signal_add
+	except ImportError: glib_signal_add = GLib.unix_signal_add # deprecated
+	class ScrollerWindow(ScrollerWindowMixin, Gtk.ApplicationWindow): pass
+	class ScrollerApp(ScrollerAppMixin, Gtk.Application): pass
 
 
 class LogMessage:
@@ -46,14 +56,229 @@ class Pos:
 @dc.dataclass
 class Image:
 	path: str
-	gtk: Gtk.Image
-	pb_src: GdkPixbuf.Pixbuf = None # source-size pixbuf, only used with sync loading
-	pb_proc: GdkPixbuf.Pixbuf = None # only used with helper module
+	gtk: 'Gtk.Image'
+	pb_src: 'GdkPixbuf.Pixbuf' = None # source-size pixbuf, only used with sync loading
+	pb_proc: 'GdkPixbuf.Pixbuf' = None # only used with helper modules
+	pb_preview: 'GdkPixbuf.Pixbuf' = None # early frame from progressive decoding
+	progressive: bool = False # nearest to viewport when queued for processing
+	tiles: 'ImageTiles' = None # for images too long to scale/display in one pixbuf
 	sz: int = None # in dim_scale
 	sz_scroll: int = None
 	sz_chk: int = None
 	displayed: bool = False
 	scrolled: bool = False
+	ts_queue: float = None # for metrics/trace
+
+@dc.dataclass
+class ImageTiles:
+	'''Source-size image pixels in an unlinked tmpfile mmap (or source pixbuf with sync loading),
+		to scale strips of it from, as these get close to the viewport.'''
+	mm: object
+	w: int
+	h: int
+	rs: int
+	alpha: bool
+	k: float = 1.0 # scale factor
+	strips: list = dc.field(default_factory=list) # (gtk, pos, sz) in scaled px
+	queued: set = dc.field(default_factory=set) # strip gtk widgets queued for rendering in threads
+	pb: 'GdkPixbuf.Pixbuf' = None # instead of mm with sync loading, which renders in main thread
+
+	@staticmethod
+	def tmp_dir_default():
+		'Returns disk-backed dir for tmpfiles, as /tmp is often tmpfs, i.e. same RAM.'
+		for p in os.environ.get('XDG_CACHE_HOME'), os.path.expanduser('~/.cache'), '/var/tmp':
+			if p and os.access(p, os.W_OK): return p
+
+	@classmethod
+	def from_buffer(cls, buff, w, h, rs, alpha, tmp_dir=None):
+		import tempfile, mmap
+		with tempfile.TemporaryFile(dir=tmp_dir or cls.tmp_dir_default()) as tmp:
+			tmp.write(buff)
+			tmp.flush()
+			mm = mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ)
+		return cls(mm, w, h, rs, alpha)
+
+	@classmethod
+	def from_pixbuf(cls, pb):
+		'Keeps pixbuf in memory, as sync loading renders strips in main thread, without disk reads.'
+		return cls( None, pb.get_width(), pb.get_height(),
+			pb.get_rowstride(), pb.get_has_alpha(), pb=pb )
+
+	def pixbuf(self, x, y, w, h):
+		'Returns new pixbuf with a copy of specified source image region.'
+		if self.pb: return self.pb.new_subpixbuf(x, y, w, h) # no need to copy it
+		if x == 0 and w == self.w: buff, rs = self.mm[y*self.rs:(y+h)*self.rs], self.rs
+		else:
+			n = 4 if self.alpha else 3
+			buff, rs = b''.join( self.mm[(o := yn*self.rs + x*n):o + w*n]
+				for yn in range(y, y + h) ), w * n
+		return GdkPixbuf.Pixbuf.new_from_bytes(
+			GLib.Bytes.new(buff), GdkPixbuf.Colorspace.RGB, self.alpha, 8, w, h, rs )
+
+	def close(self):
+		'Drops source pixels, and strips so that results from threads for them are discarded.'
+		if self.mm: self.mm.close()
+		self.pb = None
+		self.strips.clear()
+		self.queued.clear()
+
+@dc.dataclass
+class ImageTileStrip:
+	'Strip of tiled image to render in ImageProcPool thread, at pos/sz offsets in scaled px.'
+	image: Image
+	gtk: 'Gtk.Image'
+	pos: int
+	sz: int
+	pb_proc: 'GdkPixbuf.Pixbuf' = None # False - failed to render
+	ts_queue: float = None # queue_wait is only tracked for images
+	path = property(lambda s: s.image.path)
+
+class ArchiveIndex:
+	'''Cached list of files in zip/cbz or tar/cbt archive, with open handle to read them.
+		Uncompressed tar members are read by offset, without seeking shared file position.'''
+
+	types = dict(zip='zip', cbz='zip', tar='tar', cbt='tar')
+	cache_size = 64 # archives to keep indexes and open handles for
+	_cache, _cache_lock = cs.OrderedDict(), threading.Lock()
+
+	@classmethod
+	def get(cls, path):
+		'Returns cached index for archive path, re-reading it if file was changed.'
+		st = os.stat(path)
+		with cls._cache_lock:
+			if (idx := cls._cache.get(path)) and idx.key == (st.st_mtime_ns, st.st_size):
+				cls._cache.move_to_end(path)
+				return idx
+		idx = cls(path, st)
+		with cls._cache_lock:
+			cls._cache[path] = idx
+			while len(cls._cache) > cls.cache_size: cls._cache.popitem(last=False)
+		return idx
+
+	def __init__(self, path, st):
+		self.path, self.key = path, (st.st_mtime_ns, st.st_size)
+		self.type = self.types[path.rsplit('.', 1)[-1].lower()]
+		if self.type == 'zip':
+			import zipfile
+			self.src = zipfile.ZipFile(path)
+			self.members = sorted(zi.filename for zi in self.src.infolist() if not zi.is_dir())
+		else:
+			import tarfile
+			self.src = open(path, 'rb')
+			with tarfile.open(fileobj=self.src, mode='r:') as tar:
+				self.offsets = dict((ti.name, (ti.offset_data, ti.size)) for ti in tar if ti.isfile())
+			self.members = sorted(self.offsets)
+
+	def read(self, member):
+		if self.type == 'zip': return self.src.read(member)
+		offset, size = self.offsets[member]
+		return os.pread(self.src.fileno(), size, offset)
+
+class SourcePath(str):
+	'''Image path which should be read via read() and decoded from bytes-like buffer.
+		read() is defined in subclasses, as str-based classes can't enforce abc methods.'''
+	def release(self): 'Drops cached file contents, if any, after image is decoded.'
+
+class ArchivePath(SourcePath):
+	'Path to a file inside ArchiveIndex archive, as "archive/member" string.'
+	def __new__(cls, archive, member):
+		p = super().__new__(cls, f'{archive}/{member}')
+		p.archive, p.member = archive, member
+		return p
+	def read(self): return ArchiveIndex.get(self.archive).read(self.member)
+
+class MappedPath(SourcePath):
+	'''Path to a file that is mmap-ed in advance by SourcePrefetch thread,
+		with readahead started for it, so that decoder does not wait on small reads.
+		Mapping is only dropped via release(), not closed, as other threads might use it.'''
+	mm = None
+	def map(self):
+		import mmap
+		with open(self, 'rb') as src:
+			os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+			mm = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+		mm.madvise(mmap.MADV_WILLNEED)
+		self.mm = mm
+	def read(self):
+		if not (mm := self.mm): self.map(); mm = self.mm
+		return mm
+	def release(self): self.mm = None
+
+class SourcePrefetch:
+	'''Iterator that pulls paths from source iterator in a background thread,
+		up to n items ahead of the consumer, mapping files for these in advance.
+		Float delays between source loop iterations are waited-out here as well,
+			so that sources are not re-scanned and delays queued ahead of the consumer.'''
+
+	def __init__(self, src_iter, n, stage_cb=None):
+		import queue
+		self.src_iter, self.stage_cb, self.queue = src_iter, stage_cb, queue.Queue(n)
+		threading.Thread(name='prefetch', target=self.run, daemon=True).start()
+
+	def __iter__(self): return self
+	def __next__(self):
+		if (p := self.queue.get()) is StopIteration:
+			self.queue.put(p) # for any subsequent next() calls
+			raise StopIteration
+		return p
+
+	def run(self):
+		try:
+			while True:
+				ts = time.monotonic()
+				try: p = next(self.src_iter)
+				except StopIteration: break
+				path = p if isinstance(p, str) else None
+				if self.stage_cb: self.stage_cb('scan_next', ts, path=path)
+				if path and not isinstance(p, SourcePath):
+					ts, p = time.monotonic(), MappedPath(p)
+					try: p.map()
+					except (OSError, ValueError): pass # will be retried and reported by decoder
+					if self.stage_cb: self.stage_cb('prefetch', ts, path=path)
+				self.queue.put(p)
+				if isinstance(p, float): time.sleep(p)
+		except Exception as err:
+			log.exception('Failed to get next image path from sources: {}', err)
+		self.queue.put(StopIteration)
+
+
+class DirIndex:
+	'''Cached recursive listings of source dirs, shared between windows and loop iterations.
+		Listing is built lazily while iterating over it, and cached only if it was finished
+			and non-empty, getting re-used only while mtimes of all dirs in it stay same,
+			i.e. no files were added/removed/renamed there.'''
+
+	ttl = 60.0 # seconds, 0 - disable caching
+	_cache, _cache_lock = dict(), threading.Lock()
+
+	@staticmethod
+	def _mtime(p):
+		try: return os.stat(p).st_mtime_ns
+		except OSError: return None
+
+	@classmethod
+	def iter(cls, path):
+		with cls._cache_lock: ts, dirs, files = cls._cache.get(path) or (0, None, None)
+		if ( files and time.monotonic() - ts < cls.ttl
+				and all(cls._mtime(p) == mt for p, mt in dirs.items()) ):
+			yield from files
+			return
+		ts, dirs, files = time.monotonic(), dict(), list()
+		for root, dns, fns in os.walk(path):
+			dirs[root] = cls._mtime(root)
+			for fn in fns:
+				files.append(p := os.path.join(root, fn))
+				yield p
+		if cls.ttl > 0 and files:
+			with cls._cache_lock: cls._cache[path] = ts, dirs, files
+
+class LockedIter:
+	'Iterator wrapper, to pull items from same source in multiple threads.'
+	def __init__(self, src): self.src, self.lock = src, threading.Lock()
+	def __iter__(self): return self
+	def __next__(self):
+		with self.lock: return next(self.src)
+
 
 class ScrollDirection(enum.IntEnum):
 	left = 0; right = 1; up = 2; down = 3
@@ -67,12 +292,110 @@ class ISODT:
 	def __getitem__(self, k): return self.dt.strftime(k)
 
 
+class ScrollerMetrics:
+	'''Runtime counters and latency histograms, updated from gtk and worker threads.
+		Exported via unix socket (misc-metrics-socket option) and dumped on SIGUSR2.'''
+
+	hist_buckets = 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000 # ms
+
+	def __init__(self):
+		self.ts0, self.lock = time.monotonic(), threading.Lock()
+		self.counters, self.hists = cs.Counter(), dict()
+
+	def inc(self, k, n=1):
+		with self.lock: self.counters[k] += n
+
+	def observe(self, k, ms):
+		with self.lock:
+			if not (h := self.hists.get(k)):
+				h = self.hists[k] = [0] * (len(self.hist_buckets) + 1) + [0.0] # counts + sum
+			h[bisect.bisect_left(self.hist_buckets, ms)] += 1
+			h[-1] += ms
+
+	def snapshot(self, gauges):
+		with self.lock: counters, hists = dict(self.counters), dict(
+			(k, (list(it.accumulate(h[:-1])), h[-1])) for k, h in self.hists.items() )
+		uptime = time.monotonic() - self.ts0
+		gauges = dict(uptime=uptime, **gauges)
+		gauges['scan_rate'] = counters.get('scan_files', 0) / uptime
+		return gauges, counters, hists
+
+	def format_json(self, gauges):
+		import json
+		gauges, counters, hists = self.snapshot(gauges)
+		les = list(map(str, self.hist_buckets)) + ['inf']
+		return json.dumps(dict( gauges=gauges, counters=counters, hists=dict(
+			(k, dict(buckets=dict(zip(les, h)), sum=hs, count=h[-1]))
+			for k, (h, hs) in hists.items() ) )) + '\n'
+
+	def format_prom(self, gauges, prefix='image_scroller'):
+		gauges, counters, hists, lines = *self.snapshot(gauges), list()
+		for k, v in gauges.items():
+			lines.extend([f'# TYPE {prefix}_{k} gauge', f'{prefix}_{k} {v}'])
+		for k, v in counters.items():
+			lines.extend([f'# TYPE {prefix}_{k}_total counter', f'{prefix}_{k}_total {v}'])
+		les = list(map(str, self.hist_buckets)) + ['+Inf']
+		for k, (h, hs) in hists.items():
+			lines.append(f'# TYPE {prefix}_{k}_ms histogram')
+			lines.extend(f'{prefix}_{k}_ms_bucket{{le="{le}"}} {n}' for le, n in zip(les, h))
+			lines.extend([f'{prefix}_{k}_ms_sum {hs}', f'{prefix}_{k}_ms_count {h[-1]}'])
+		return '\n'.join(lines) + '\n'
+
+
+class ScrollerTrace:
+	'''Writes Chrome/Perfetto trace-event JSON, with spans of image processing stages
+		on per-thread tracks, and async spans for each image from path to first draw.
+		Timestamps are time.monotonic() seconds, same clock as in pixbuf_proc modules.'''
+
+	def __init__(self, path):
+		import json
+		self.dumps, self.lock, self.pid = json.dumps, threading.Lock(), os.getpid()
+		self.file, self.tids, self.images = open(path, 'w'), set(), set()
+		self.file.write('[\n')
+
+	def write(self, ev):
+		'Writes event for current thread track, adding its name there, if not done yet.'
+		tid = threading.get_native_id()
+		with self.lock:
+			if self.file.closed: return # daemon threads after exit
+			if tid not in self.tids:
+				self.tids.add(tid)
+				name = threading.current_thread().name
+				if threading.current_thread() is threading.main_thread(): name = 'gtk'
+				self.file.write(self.dumps(dict( ph='M', pid=self.pid,
+					tid=tid, name='thread_name', args=dict(name=name) )) + ',\n')
+			self.file.write(self.dumps(dict(pid=self.pid, tid=tid, **ev)) + ',\n')
+
+	def span(self, name, ts0, ts1=None, path=None):
+		if ts1 is None: ts1 = time.monotonic()
+		self.write(dict( ph='X', name=name, cat='stage',
+			ts=int(ts0 * 1e6), dur=int((ts1 - ts0) * 1e6), args=dict(path=path) ))
+
+	def image(self, image, ts=None, end=False):
+		'Begins or ends async span for image lifecycle, ignoring repeated ends.'
+		if end:
+			if id(image) not in self.images: return
+			self.images.discard(id(image))
+		else: self.images.add(id(image))
+		if ts is None: ts = time.monotonic()
+		self.write(dict( ph='e' if end else 'b', name='image', cat='image',
+			id=id(image), ts=int(ts * 1e6), args=dict(path=image.path) ))
+
+	def close(self):
+		with self.lock:
+			self.file.write(self.dumps(dict( ph='M', pid=self.pid,
+				name='process_name', args=dict(name='infinite-image-scroller') )) + '\n]\n')
+			self.file.close()
+
+
 class ScrollerConf:
 
 	misc_app_id = 'net.fraggod.infinite-image-scroller'
 	misc_no_session = False
 	misc_box_spacing = 3
 	misc_event_delay = 0.2 # debounce delay for scrolling, window resizing, clicks and such
+	misc_metrics_socket = '' # unix socket path to serve runtime metrics on
+	misc_metrics_format = 'json' # json or prom, also used for SIGUSR2 dumps to stderr
 
 	win_title = 'infinite-image-scroller'
 	win_role = 'scroller-main'
@@ -100,9 +423,10 @@ class ScrollerConf:
 		' stick maximize fullscreen keep_above keep_below decorated'
 		' deletable skip_taskbar skip_pager urgency accept_focus'
 		' auto_startup_notification mnemonics_visible focus_visible' ).split()
-	_win_type_hints_all = dict( ((e.value_nick, v) for v, e in es.items() if v)
-		if (es := getattr(et := Gdk.WindowTypeHint, '__enum_values__', None))
-		else ((e.name.lower(), e.value) for e in et if e.value) )
+	_win_type_hints_all = dict( # GdkWindowTypeHint nicks/values, except normal=0
+		(k, n) for n, k in enumerate((
+			' dialog menu toolbar splashscreen utility dock desktop'
+			' dropdown-menu popup-menu tooltip notification combo dnd' ).split(), 1) )
 
 	scroll_direction = 'down'
 	scroll_auto = '' # px:interval
@@ -112,7 +436,17 @@ class ScrollerConf:
 	scroll_queue_preload_at = 0.6
 	_scroll_auto_key_start = 1, 0.01
 
-	image_proc_threads = 0
+	image_proc_threads = 0 # max threads, 0 - CPU thread count
+	image_proc_threads_min = 1 # threads to keep running when idle
+	image_proc_idle_exit = 10.0 # seconds of idling for threads above min to exit after
+	image_proc_nice = 10 # niceness increment for threads/processes, 0 - disable
+	image_proc_ioprio = '7' # best-effort I/O priority level (0-7), "idle", or empty - disable
+	image_proc_cpus = '' # CPU affinity for threads/processes, e.g. "2-7" or "1,3", empty - any
+	image_proc_band_px = 16_000_000 # split larger images into row-bands for idle threads, 0 - disable
+	image_proc_py_pool = True # use pixbuf_proc_py process-pool if pixbuf_proc.so is unavailable
+	image_proc_buffer_pool = 256.0 # MiB of unused pixel buffers to keep for reuse, 0 - disable
+	image_proc_buffer_trim = 30.0 # seconds of no new images to free pooled buffers after
+	image_proc_cache = 64.0 # MiB of scaled pixbufs to share between windows/loops, 0 - disable
 	image_opacity = 1.0
 	image_brightness = 1.0
 	image_brightness_adapt = '' # [+/-](0-1.0)
@@ -120,7 +454,17 @@ class ScrollerConf:
 	_image_brightness_adapt_dir = BrightnessAdaptDir.both
 	image_scale_algo = 'bilinear'
 	image_open_attempts = 3
+	image_tile_at = 4.0 # split images longer than N window sizes into strips, 0 - disable
+	image_tile_strip = 512 # px
+	image_tile_margin = 1.0 # window sizes around viewport to render strips in
+	image_tile_dir = '' # helper-module tmpfiles with decoded pixels, empty - XDG_CACHE_HOME or /var/tmp
+	image_archive_cache = 64 # zip/tar archives to keep member indexes and open handles for
+	image_prefetch = 4 # paths to read ahead of decoding via mmap/readahead, 0 - disable
+	image_progressive = 0.15 # seconds of decoding to show partial frame of next image after
+	image_dir_index_ttl = 60.0 # seconds to reuse unchanged source dir listings for, 0 - disable
 	_image_proc_module = None
+	_image_proc_cpus = None # set of CPU numbers
+	_trace = None # ScrollerTrace
 
 	# Key combos format is lowercase "[mod1 ...] key, ...", with modifier keys alpha-sorted
 	# Use --debug option to see which exact key-sums get pressed
@@ -188,11 +532,136 @@ class ScrollerConf:
 			print(f'{k} = {v}')
 
 
-class ScrollerWindow(Gtk.ApplicationWindow):
+class ImageProcPool:
+	'''Background threads to load/process images for all windows via pixbuf_proc module,
+		picking queued images and tiled-image strips from windows in round-robin order,
+		and LRU cache of resulting pixbufs, shared between windows and loop iterations.'''
+
+	def __init__(self, pp, conf, metrics, wins):
+		self.pp, self.conf, self.metrics, self.wins = pp, conf, metrics, wins
+		self.queues, self.queues_cond, self.busy = cs.OrderedDict(), threading.Condition(), set()
+		self.cache, self.cache_lock, self.cache_bytes = cs.OrderedDict(), threading.Lock(), 0
+		self.cache_max = int(conf.image_proc_cache * 2**20)
+		if conf.image_proc_band_px: pp.set_band_threads(conf.image_proc_threads - 1)
+		pp.buffer_pool(int(conf.image_proc_buffer_pool * 2**20))
+		self.thread_kill = threading.get_ident(), signal.SIGUSR1
+		glib_signal_add(GLib.PRIORITY_DEFAULT, self.thread_kill[1], self.results_cb)
+		self.threads, self.threads_n, self.idle = dict(), it.count(), 0
+		with self.queues_cond:
+			for n in range(min(conf.image_proc_threads_min, conf.image_proc_threads)):
+				self.thread_start()
+		if conf.image_proc_buffer_trim > 0:
+			self.trim_ev = threading.Event()
+			threading.Thread(name='buffer-trim', target=self.trim_run, daemon=True).start()
+		else: self.trim_ev = None
+
+	def thread_start(self):
+		'Starts new worker thread, must be called with queues_cond locked.'
+		n = next(self.threads_n)
+		self.threads[n] = t = threading.Thread(
+			name=f'set_pixbuf.{n}', target=self.run, args=[n], daemon=True )
+		t.start()
+		log.debug('pixbuf_proc: started thread #{} [threads={}]', n, len(self.threads))
+
+	def put(self, win, image, first=False):
+		with self.queues_cond:
+			q = self.queues.setdefault(win, cs.deque())
+			if first: q.appendleft(image) # tile strips are needed in viewport asap
+			else: q.append(image)
+			if ( sum(map(len, self.queues.values())) > self.idle
+				and len(self.threads) < self.conf.image_proc_threads ): self.thread_start()
+			self.queues_cond.notify()
+
+	def get(self, n):
+		'''Returns (win, image) from first window queue with images, moving it to the end.
+			Returns (None, None) if thread should exit, after idling above min thread count.'''
+		with self.queues_cond:
+			self.idle += 1
+			try:
+				while not (win := next((win for win, q in self.queues.items() if q), None)):
+					if ( not self.queues_cond.wait(self.conf.image_proc_idle_exit or None)
+							and len(self.threads) > self.conf.image_proc_threads_min
+							and not any(self.queues.values()) ): # put() can notify on timeout
+						del self.threads[n]
+						return None, None
+			finally: self.idle -= 1
+			self.queues.move_to_end(win)
+			return win, self.queues[win].popleft()
+
+	def qsize(self):
+		with self.queues_cond: return sum(map(len, self.queues.values()))
+
+	def run(self, n):
+		proc_priority_set(
+			self.conf.image_proc_nice, self.conf.image_proc_ioprio, self.conf._image_proc_cpus )
+		try:
+			while True:
+				win, image = self.get(n)
+				if not win: break
+				log.debug('pixbuf_proc [thread]: {}', image.path)
+				if image.ts_queue:
+					win.stage_done('queue_wait', image.ts_queue, image)
+					image.ts_queue = None
+				self.busy.add(n)
+				try:
+					if isinstance(image, ImageTileStrip): win.image_tiles_render_strip(image)
+					else: win.image_set_pixbuf_proc(image)
+				except Exception as err: # e.g. broken worker pool or ENOSPC for tiles tmpfile
+					win.metrics.inc('images_failed')
+					win.log.error( 'Failed to load/process image:'
+						' {} [{}] {}', image.path, err.__class__.__name__, err )
+					image.pb_proc = False
+				finally: self.busy.discard(n)
+				win.thread_results.append(image)
+				signal.pthread_kill(*self.thread_kill)
+				if self.trim_ev: self.trim_ev.set()
+		finally:
+			with self.queues_cond: self.threads.pop(n, None)
+			log.debug('pixbuf_proc: thread #{} exit [threads={}]', n, len(self.threads))
+
+	def trim_run(self):
+		'''Frees pooled buffers and unused heap memory in background thread,
+			after no images were processed by any window for image-proc-buffer-trim seconds.'''
+		proc_priority_set(
+			self.conf.image_proc_nice, self.conf.image_proc_ioprio, self.conf._image_proc_cpus )
+		while True:
+			self.trim_ev.wait()
+			self.trim_ev.clear()
+			while self.trim_ev.wait(self.conf.image_proc_buffer_trim): self.trim_ev.clear()
+			if self.busy or self.qsize(): continue # next processed image will restart timer
+			ts = time.monotonic()
+			freed = self.pp.buffer_pool_trim()
+			log.debug( 'pixbuf_proc: freed {:,d} B of pooled'
+				' buffers [{:,.1f} ms]', freed, (time.monotonic() - ts) * 1e3 )
+
+	def results_cb(self):
+		for win in self.wins:
+			if win.thread_results: win.image_set_pixbuf_thread_cb()
+		return True
+
+	def cache_get(self, key):
+		if not (self.cache_max and key): return
+		with self.cache_lock:
+			if pb := self.cache.get(key): self.cache.move_to_end(key)
+		self.metrics.inc('pixbuf_cache_hits' if pb else 'pixbuf_cache_misses')
+		return pb
+
+	def cache_put(self, key, pb):
+		if not key or (sz := pb.get_rowstride() * pb.get_height()) > self.cache_max: return
+		with self.cache_lock:
+			if key in self.cache: return
+			self.cache[key], self.cache_bytes = pb, self.cache_bytes + sz
+			while self.cache_bytes > self.cache_max:
+				k, pb = self.cache.popitem(last=False)
+				self.cache_bytes -= pb.get_rowstride() * pb.get_height()
+
+
+class ScrollerWindowMixin: # Gtk.ApplicationWindow - see gtk_import()
 
 	def __init__(self, app, src_paths_iter, conf):
 		super().__init__(name='infinite-image-scroller', application=app)
 		self.app, self.src_paths_iter, self.conf = app, src_paths_iter, conf
+		self.conf_base = copy.copy(conf) # for changes on reload, as conf gets tweaked at runtime
 		self.log = get_logger('win')
 
 		self.set_title(self.conf.win_title)
@@ -201,19 +670,12 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 			self.log.debug('Using icon: {}', self.conf.win_icon)
 			self.set_icon_name(self.conf.win_icon)
 
-		self.pp = self.conf._image_proc_module
-		if self.pp:
-			self.pp, threading, queue = self.pp
-			self.thread_queue = queue.Queue()
-			self.thread_list = list(
-				threading.Thread( name=f'set_pixbuf.{n}',
-					target=self.image_set_pixbuf_thread, daemon=True )
-				for n in range(self.conf.image_proc_threads) )
-			for t in self.thread_list: t.start()
-			self.thread_kill = threading.get_ident(), signal.SIGUSR1
-			glib_signal_add( GLib.PRIORITY_DEFAULT,
-				self.thread_kill[1], self.image_set_pixbuf_thread_cb )
-			self.thread_results = list()
+		self.metrics, self.metrics_frame_ts = app.metrics, None
+		self.trace = self.conf._trace
+		if self.conf.image_prefetch > 0: self.src_paths_iter = SourcePrefetch(
+			self.src_paths_iter, self.conf.image_prefetch, self.stage_done )
+
+		self.pool, self.pp, self.thread_results = app.pool, app.pool and app.pool.pp, list()
 
 		self.init_widgets()
 
@@ -236,6 +698,7 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 		self.scroll.add(self.box)
 		self.box_images = cs.deque()
 		self.box_images_init = self.box_images_cooldown = None
+		self.tile_len = 0 # checked from threads, set in image_set_pixbufs
 		self.ev_timers = dict()
 
 		self.dim_scale, self.dim_scroll, self.dim_scroll_n = (
@@ -279,12 +742,14 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 		self.place_window(self)
 		self.place_window_ev = self.connect('configure-event', self.place_window)
 		self.connect('key-press-event', self.window_key)
+		self.connect( 'realize', lambda w: self.get_frame_clock()\
+			.connect('after-paint', self.metrics_frame) )
 
 		self.connect( 'configure-event',
 			ft.partial(self.ev_debounce, ev='set-pixbufs', cb=self.image_set_pixbufs) )
-		if self.conf.keys_click_print_format:
-			self.connect( 'button-press-event', lambda w, ev:
-				self.ev_debounce(ev.x, ev.y, ev='click', cb=self.image_click, now=True) )
+		self.connect( 'button-press-event', lambda w, ev: # format can be set on SIGHUP
+			self.conf.keys_click_print_format and self.ev_debounce(
+				ev.x, ev.y, ev='click', cb=self.image_click, now=True ) )
 
 		self.scroll_timer = self.scroll_linger_last = None
 		if self.conf.scroll_auto: self.scroll_adjust(ScrollAdjust.toggle)
@@ -309,6 +774,36 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 		self.ev_debounce(*ev_args, ev=ev, cb=cb, delay=delay, **debounce_kws)
 
 
+	def stage_done(self, name, ts, image=None, ts1=None, path=None):
+		'Records metrics/trace span for stage started at time.monotonic() ts.'
+		if ts1 is None: ts1 = time.monotonic()
+		self.metrics.observe(name, (ts1 - ts) * 1e3)
+		if self.trace: self.trace.span(name, ts, ts1, path or (image and image.path))
+
+	def trace_draw(self, image):
+		'Records first draw of image widget, ending lifecycle span for it.'
+		if not self.trace: return
+		ts, hs = list(), list()
+		def draw_done(w, ctx):
+			for h in hs: w.disconnect(h)
+			if ts: self.trace.span('image_draw', ts[0], path=image.path)
+			self.trace.image(image, end=True)
+		hs.extend([ image.gtk.connect('draw', lambda w, ctx: ts.append(time.monotonic())),
+			image.gtk.connect_after('draw', draw_done) ])
+
+	def metrics_frame(self, clock):
+		'Counts frames missed between repaints while auto-scrolling.'
+		ts = clock.get_frame_time()
+		if self.scroll_timer and (ts_last := self.metrics_frame_ts):
+			refresh = clock.get_refresh_info(ts)[0] or 16_667
+			refresh = max(refresh, self.conf.scroll_auto[1] * 1e6) # slow scroll is not a drop
+			if (dropped := round((ts - ts_last) / refresh) - 1) > 0:
+				self.metrics.inc('frames_dropped', dropped)
+			self.metrics.inc('frames')
+			self.metrics.observe('frame_interval', (ts - ts_last) / 1e3)
+		self.metrics_frame_ts = ts if self.scroll_timer else None
+
+
 	def set_visual_rgba(self, w, *ev_data):
 		visual = w.get_screen().get_rgba_visual()
 		if visual: w.set_visual(visual)
@@ -396,6 +891,7 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 			adj.set_value(self.dim_scroll_translate(pos, pos_max))
 		# Check is to avoid expensive updates/reloads while window is resized
 		if not self.ev_debounce_is_set('set-pixbufs'): self.image_set_pixbufs()
+		self.image_tiles_update()
 		return repeat
 
 	def image_at_center(self, offset_max):
@@ -440,16 +936,23 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 		'Adds image and returns it, or returns None if there is nothing more to add.'
 		if self.box_images_cooldown: return
 		for n in range(self.conf.image_open_attempts):
+			ts = time.monotonic()
 			try: p = next(self.src_paths_iter)
 			except StopIteration: p = None
+			self.stage_done( 'prefetch_wait' if isinstance(self.src_paths_iter,
+				SourcePrefetch) else 'scan_next', ts, path=p if isinstance(p, str) else None )
+			if isinstance(p, str): self.metrics.inc('scan_files')
 			if not p: return
 			if isinstance(p, float):
 				self.box_images_cooldown = GLib.timeout_add(
 					p * 1000, lambda: setattr(self, 'box_images_cooldown', None) )
 				return
 			image = self.image_load(p)
-			if image: break
+			if image:
+				if self.trace: self.trace.image(image, ts)
+				break
 		else:
+			self.metrics.inc('images_gave_up')
 			self.log.error( 'Failed to get new image'
 				' in {} attempt(s), giving up', self.conf.image_open_attempts )
 			return
@@ -461,16 +964,24 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 	def image_remove(self, image):
 		self.box.remove(image.gtk)
 		image.gtk.destroy()
+		if image.tiles: image.tiles.close()
+		if self.trace: self.trace.image(image, end=True)
 
 	def image_load(self, path):
 		self.log.debug('Adding image: {}', path)
 		image = Image(path=path, gtk=Gtk.Image())
 		if not self.pp:
-			try: image.pb_src = GdkPixbuf.Pixbuf.new_from_file(path)
+			ts = time.monotonic()
+			try:
+				image.pb_src = ( pixbuf_from_bytes(path.read())
+					if isinstance(path, SourcePath) else GdkPixbuf.Pixbuf.new_from_file(path) )
 			except Exception as err:
+				self.metrics.inc('images_failed')
 				self.log.error( 'Failed to create gdk-pixbuf'
 					' from file: [{}] {}', err.__class__.__name__, err )
 				return
+			if isinstance(path, SourcePath): path.release()
+			self.stage_done('image_load', ts, image)
 		if self.conf.image_opacity < 1.0:
 			image.gtk.set_opacity(self.conf.image_opacity)
 		return image
@@ -501,15 +1012,35 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 
 		self.ev_debounce_clear('set-pixbufs')
 		sz = getattr(self.get_allocation(), self.dim_scale)
+		if self.conf.image_tile_at > 0:
+			self.tile_len = getattr(self.get_allocation(), self.dim_scroll) * self.conf.image_tile_at
+		progressive = ( self.pp and self.conf.image_progressive > 0
+			and getattr(self.pp, 'has_preview', True) ) # next image to be scrolled into view
+		if progressive: progressive = next((img for img in self.box_images if not img.displayed), None)
 		for image in list(self.box_images):
 			if image.sz_chk == sz: continue
 			image.sz_chk = sz
 
-			if image.pb_src: # simple sync processing with no helper module
+			if image.tiles: # strips get re-rendered on demand
+				image.sz = sz
+				self.image_tiles_layout(image)
+
+			elif image.pb_src: # simple sync processing with no helper module
 				w, h = image.pb_src.get_width(), image.pb_src.get_height()
+				if self.image_tiles_check(sz, w, h):
+					image.tiles = ImageTiles.from_pixbuf(image.pb_src)
+					image.pb_src, image.sz = None, sz
+					self.image_tiles_layout(image)
+					self.trace_draw(image)
+					continue
 				w, h = ((sz, int(sz / (w / h))) if self.dim_scale_w else (int(sz * (w / h)), sz))
+				ts = time.monotonic()
 				pixbuf = image.pb_src.scale_simple(w, h, self.conf.image_scale_algo)
+				self.stage_done('image_scale', ts, image)
+				ts = time.monotonic()
 				image.gtk.set_from_pixbuf(pixbuf)
+				self.stage_done('image_display', ts, image)
+				if not image.displayed: self.trace_draw(image)
 				image.sz, image.sz_scroll, image.displayed = w, h, True
 
 			else: # background pixbuf_proc.so threads, except when init=True
@@ -519,33 +1050,76 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 					self.image_set_pixbuf_proc(image)
 					if image.pb_proc: init_sz -= self.dim_scroll_for_pixbuf(image.pb_proc)
 					self.thread_results.append(image)
-				else: self.thread_queue.put_nowait(image)
+				else:
+					image.ts_queue, image.progressive = time.monotonic(), image is progressive
+					self.pool.put(self, image)
 
 		if init and self.pp: self.image_set_pixbuf_thread_cb()
 
 
 	def image_set_pixbuf_proc(self, image):
-		sz = image.sz
+		sz, src, proc = image.sz, image.path, self.pp.process_image_file
 		w, h = ((sz, -1) if self.dim_scale_w else (-1, sz))
+		try: # files can be replaced in-place between loops, so mtime/size are part of the key
+			src_key = ( ArchiveIndex.get(src.archive).key
+				if isinstance(src, ArchivePath) else op.attrgetter('st_mtime_ns', 'st_size')(os.stat(src)) )
+		except Exception: cache_key = None # will fail to load below anyway
+		else: cache_key = ( str(src), src_key, w, h, int(self.conf.image_scale_algo),
+			self.conf.image_brightness, int(self.conf._image_brightness_adapt_dir),
+			self.conf._image_brightness_adapt_k )
+		if pb := self.pool.cache_get(cache_key):
+			if isinstance(src, SourcePath): src.release()
+			image.pb_proc = pb
+			return
+		ts_proc = time.monotonic()
+		if image.progressive and not isinstance(src, SourcePath):
+			src = MappedPath(src) # preview frames are only posted when decoding from bytes
+		if isinstance(src, SourcePath):
+			ts, proc, path = time.monotonic(), self.pp.process_image_bytes, src
+			try: src = path.read()
+			except Exception as err:
+				self.metrics.inc('images_failed')
+				self.log.error( 'Failed to read image file:'
+					' {} [{}] {}', image.path, err.__class__.__name__, err )
+				image.pb_proc = False
+				return
+			path.release()
+			self.stage_done('source_read', ts, image)
+		if tiled := self.tile_len > 0:
+			src_w, src_h = pixbuf_size(src)
+			if tiled := self.image_tiles_check(sz, src_w, src_h):
+				w = h = 0 # source-size pixels to render strips from
+		proc_preview = list() if tiled or not image.progressive else [ ft.partial(
+			self.image_set_pixbuf_preview, image, sz, ts_proc ), self.conf.image_progressive ]
+		# Large images can be split between this thread and all currently-idle ones
+		bands = self.conf.image_proc_threads - len(self.pool.busy) + 1
 		try:
-			buff, w, h, rs, alpha = self.pp.process_image_file(
-				image.path, w, h, int(self.conf.image_scale_algo), self.conf.image_brightness,
-				int(self.conf._image_brightness_adapt_dir), self.conf._image_brightness_adapt_k )
+			buff, w, h, rs, alpha, stages = proc(
+				src, w, h, int(self.conf.image_scale_algo), self.conf.image_brightness,
+				int(self.conf._image_brightness_adapt_dir), self.conf._image_brightness_adapt_k,
+				max(1, bands), self.conf.image_proc_band_px, True, *proc_preview )
 		except self.pp.error as err:
+			self.metrics.inc('images_failed')
 			self.log.error('Failed to load/process image: {}', err)
 			image.pb_proc = False
 			return
+		for name, t0, t1 in stages: self.stage_done(f'proc_{name}', t0 / 1e6, image, t1 / 1e6)
+		if tiled:
+			image.tiles = ImageTiles.from_buffer(buff, w, h, rs, alpha, self.conf.image_tile_dir)
+			return
+		pb = GdkPixbuf.Pixbuf.new_from_data(buff, GdkPixbuf.Colorspace.RGB, alpha, 8, w, h, rs)
+		self.pool.cache_put(cache_key, pb)
 		if image.sz != sz: return # was re-queued
-		image.pb_proc = GdkPixbuf.Pixbuf\
-			.new_from_data(buff, GdkPixbuf.Colorspace.RGB, alpha, 8, w, h, rs)
+		image.pb_proc = pb
 
-	def image_set_pixbuf_thread(self):
-		while True:
-			image = self.thread_queue.get()
-			log.debug('pixbuf_proc [thread]: {}', image.path)
-			self.image_set_pixbuf_proc(image)
-			self.thread_results.append(image)
-			signal.pthread_kill(*self.thread_kill)
+	def image_set_pixbuf_preview(self, image, sz, ts, buff, w, h, rs, alpha):
+		'Called from pixbuf_proc decoder thread with partially-decoded low-res frame.'
+		if image.sz != sz or image.pb_proc is not None: return # re-queued or done
+		self.stage_done('proc_preview', ts, image)
+		image.pb_preview = GdkPixbuf.Pixbuf\
+			.new_from_data(buff, GdkPixbuf.Colorspace.RGB, alpha, 8, w, h, rs)
+		self.thread_results.append(image)
+		signal.pthread_kill(*self.pool.thread_kill)
 
 	def image_set_pixbuf_thread_cb(self):
 		# Note: these are only called in series by glib, and do not interrupt each other
@@ -553,17 +1127,110 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 			try: image = self.thread_results.pop()
 			except IndexError: break
 			log.debug('pixbuf_proc [signal]: {}', image.path)
-			if image.pb_proc is False:
+			if isinstance(image, ImageTileStrip):
+				if not (t := image.image.tiles): continue
+				t.queued.discard(image.gtk)
+				if image.pb_proc and (image.gtk, image.pos, image.sz) in t.strips:
+					image.gtk.set_from_pixbuf(image.pb_proc)
+					self.ev_delay('tiles', 0, self.image_tiles_update) # in case it's scrolled away
+			elif image.pb_proc is False:
 				self.box_images.remove(image)
 				self.image_remove(image)
+			elif image.pb_proc is None and not image.tiles: # preview frame or re-queued image
+				if not (pb := image.pb_preview) or image.displayed: continue
+				image.gtk.set_from_pixbuf(pb)
+				image.sz_scroll, image.pb_preview = self.dim_scroll_for_pixbuf(pb), None
+				self.metrics.inc('images_preview')
+				if self.dim_scroll_rev:
+					image.gtk.connect('size-allocate', ft.partial(self.image_set_scroll, image))
 			else:
-				image.gtk.set_from_pixbuf(image.pb_proc)
-				image.sz_scroll = getattr(image.pb_proc, f'get_{self.dim_scroll}')()
+				ts = time.monotonic()
+				if image.tiles: self.image_tiles_layout(image)
+				else:
+					image.gtk.set_from_pixbuf(image.pb_proc)
+					image.sz_scroll = getattr(image.pb_proc, f'get_{self.dim_scroll}')()
+				self.stage_done('image_display', ts, image)
+				if not image.displayed: self.trace_draw(image)
 				if self.dim_scroll_rev: # scroll pos will change when image is drawn
 					image.gtk.connect('size-allocate', ft.partial(self.image_set_scroll, image))
-				image.pb_proc, image.displayed = None, True
+				image.pb_proc = image.pb_preview = None
+				image.displayed = True
 		return True
 
+	def image_tiles_check(self, sz, w, h):
+		'Returns True if image with w/h source size should be split into strips.'
+		if not (self.tile_len and w and h): return False
+		src_sz, src_len = (w, h) if self.dim_scale_w else (h, w)
+		return src_len * sz / src_sz > self.tile_len
+
+	def image_tiles_layout(self, image):
+		'Creates empty placeholder strips for tiled image, to be rendered by image_tiles_update.'
+		t = image.tiles
+		if isinstance(image.gtk, Gtk.Image): # replace with a box of strips
+			box = (Gtk.VBox if self.dim_scroll_v else Gtk.HBox)(spacing=0)
+			box.set_opacity(image.gtk.get_opacity())
+			pos = self.box.child_get_property(image.gtk, 'position')
+			self.dim_box_pack(box, False, False, 0)
+			self.box.reorder_child(box, pos)
+			self.box.remove(image.gtk)
+			image.gtk.destroy()
+			box.connect( 'size-allocate', lambda *ev_data:
+				self.ev_delay('tiles', 0, self.image_tiles_update) )
+			image.gtk = box
+			box.show()
+		for gtk, pos, sz in t.strips:
+			image.gtk.remove(gtk)
+			gtk.destroy()
+		t.strips.clear()
+		t.queued.clear() # results for old strips are discarded
+		src_sz, src_len = (t.w, t.h) if self.dim_scale_w else (t.h, t.w)
+		t.k = image.sz / src_sz
+		image.sz_scroll = int(src_len * t.k)
+		for pos in range(0, image.sz_scroll, self.conf.image_tile_strip):
+			sz, gtk = min(self.conf.image_tile_strip, image.sz_scroll - pos), Gtk.Image()
+			gtk.set_size_request(*((image.sz, sz) if self.dim_scale_w else (sz, image.sz)))
+			image.gtk.pack_start(gtk, False, False, 0)
+			t.strips.append((gtk, pos, sz))
+			gtk.show()
+		image.displayed = True
+
+	def image_tiles_render(self, image, pos, sz):
+		'Returns pixbuf for a strip of tiled image at pos/sz offsets in scaled pixels.'
+		t = image.tiles
+		src_len = t.h if self.dim_scale_w else t.w
+		s0 = max(0, int(pos / t.k) - 1)
+		s1 = min(src_len, math.ceil((pos + sz) / t.k) + 1)
+		if self.dim_scale_w:
+			src, w, h, ox, oy = t.pixbuf(0, s0, t.w, s1 - s0), image.sz, sz, 0, s0 * t.k - pos
+		else: src, w, h, ox, oy = t.pixbuf(s0, 0, s1 - s0, t.h), sz, image.sz, s0 * t.k - pos, 0
+		pb = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, t.alpha, 8, w, h)
+		src.scale(pb, 0, 0, w, h, ox, oy, t.k, t.k, self.conf.image_scale_algo)
+		return pb
+
+	def image_tiles_render_strip(self, strip):
+		'Renders ImageTileStrip in ImageProcPool thread, where tmpfile reads do not block GUI.'
+		try: strip.pb_proc = self.image_tiles_render(strip.image, strip.pos, strip.sz)
+		except ValueError: strip.pb_proc = False # mmap closed by image_remove()
+
+	def image_tiles_update(self):
+		'Renders tiled-image strips close to the viewport and drops pixbufs of all others.'
+		self.ev_debounce_clear('tiles')
+		sz_win = getattr(self.scroll.get_allocation(), self.dim_scroll)
+		margin = sz_win * self.conf.image_tile_margin
+		for image in self.box_images:
+			if not image.tiles: continue
+			for gtk, pos, sz in image.tiles.strips:
+				if not (o := gtk.translate_coordinates(self.scroll, 0, 0)): continue
+				o = o[self.dim_scroll_n]
+				shown = gtk.get_storage_type() == Gtk.ImageType.PIXBUF
+				if -margin - sz < o < sz_win + margin:
+					if shown or gtk in image.tiles.queued: continue
+					if not self.pool: gtk.set_from_pixbuf(self.image_tiles_render(image, pos, sz))
+					else:
+						image.tiles.queued.add(gtk)
+						self.pool.put(self, ImageTileStrip(image, gtk, pos, sz), first=True)
+				elif shown: gtk.clear()
+
 	def image_set_scroll(self, image, w, ev):
 		if image.scrolled: return
 		image.scrolled = True
@@ -574,6 +1241,38 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 		self.scroll_adj.set_value(offset)
 
 
+	def conf_update(self, conf):
+		'''Applies values that changed in reloaded conf, keeping loaded images and sources.
+			Images are only re-processed if scaling/brightness parameters changed.'''
+		changed = set( k for k in (
+				'misc_event_delay misc_box_spacing image_opacity image_open_attempts'
+				' image_scale_algo image_brightness _image_brightness_adapt_k _image_brightness_adapt_dir'
+				' scroll_auto scroll_adjust_k scroll_pause scroll_queue_size scroll_queue_preload_at'
+				' keys_quit keys_scroll_faster keys_scroll_slower keys_scroll_toggle'
+				' keys_click_print_format' ).split()
+			if getattr(conf, k) != getattr(self.conf_base, k) )
+		if not changed: return self.log.debug('Configuration reload: no changes')
+		self.log.debug('Configuration reload: {}', ' '.join(sorted(changed)))
+		for k in changed: setattr(self.conf, k, getattr(conf, k))
+		self.conf_base = copy.copy(conf)
+
+		if 'misc_box_spacing' in changed: self.box.set_spacing(self.conf.misc_box_spacing)
+		if 'image_opacity' in changed:
+			for image in self.box_images: image.gtk.set_opacity(self.conf.image_opacity)
+		if any(k.startswith('keys_') for k in changed): self._key_sums = None
+		if 'scroll_auto' in changed:
+			if self.scroll_timer: GLib.source_remove(self.scroll_timer)
+			self.scroll_timer = None
+			if self.conf.scroll_auto: self.scroll_adjust(ScrollAdjust.toggle)
+
+		if changed & { 'image_scale_algo', 'image_brightness',
+				'_image_brightness_adapt_k', '_image_brightness_adapt_dir' }:
+			for image in self.box_images:
+				# Tiles are rendered from processed source-size pixels, so only get new settings
+				#  when image is loaded again, which is also the case for images in-flight in threads
+				if not image.tiles: image.sz_chk = None
+		self.scroll_update(self.scroll_adj) # re-process images and apply queue size changes
+
 	def scroll_adjust(self, adj):
 		'Auto-scrolling start/pause and speed control function.'
 		self.ev_debounce_clear('scroll-pause')
@@ -610,21 +1309,141 @@ class ScrollerWindow(Gtk.ApplicationWindow):
 				self.scroll_update, self.scroll_adj, offset=px, repeat=True ))
 
 
-class ScrollerApp(Gtk.Application):
+class ScrollerAppMixin: # Gtk.Application - see gtk_import()
+	# Signals are used instead of do_* vfuncs, as latter can't be defined in mixins
 
-	def __init__(self, src_paths_iter, conf):
-		self.src_paths_iter, self.conf = src_paths_iter, conf
+	def __init__(self, windows, conf, conf_load=None):
+		'''Opens ScrollerWindow for each (src_paths_iter, conf) tuple in windows list,
+			with main conf used for things shared between them, like image processing pool.
+			conf_load callback should return new conf to apply to windows on SIGHUP.'''
+		self.windows, self.conf, self.wins, self.pool = windows, conf, list(), None
+		self.conf_load = conf_load
 		super().__init__()
 		if self.conf.misc_app_id:
 			self.set_application_id(self.conf.misc_app_id.format(pid=os.getpid()))
 		if self.conf.misc_no_session: self.set_property('register-session', False)
+		self.connect('startup', self.app_startup)
+		self.connect('activate', self.app_activate)
+
+	def app_startup(self, app):
+		self.metrics = ScrollerMetrics()
+		if pp := self.conf._image_proc_module:
+			self.pool = ImageProcPool(pp, self.conf, self.metrics, self.wins)
+		glib_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR2, self.metrics_dump)
+		if self.conf.misc_metrics_socket: self.metrics_serve(self.conf.misc_metrics_socket)
+		if self.conf_load: glib_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGHUP, self.conf_reload)
+		startup_timing('app startup')
+
+	def app_activate(self, app):
+		for src_paths_iter, conf in self.windows:
+			win = ScrollerWindow(self, src_paths_iter, conf)
+			win.connect('delete-event', lambda w,*data: self.quit())
+			win.show_all()
+			self.wins.append(win)
+		startup_timing('windows')
+
+	def conf_reload(self):
+		log.debug('Reloading configuration on SIGHUP...')
+		try: conf = self.conf_load()
+		except SystemExit: # argparse/validation errors, printed to stderr
+			log.error('Failed to reload configuration, keeping old one')
+			return True
+		for win in self.wins: win.conf_update(conf)
+		return True
 
-	def do_activate(self):
-		win = ScrollerWindow(self, self.src_paths_iter, self.conf)
-		win.connect('delete-event', lambda w,*data: self.quit())
-		win.show_all()
+	def metrics_gauges(self):
+		gauges = dict( windows=len(self.wins),
+			images=sum(len(win.box_images) for win in self.wins),
+			images_displayed=sum( bool(img.displayed)
+				for win in self.wins for img in win.box_images ) )
+		if self.pool:
+			pooled, hits, misses = self.pool.pp.buffer_pool_stats()
+			gauges.update( thread_queue=self.pool.qsize(),
+				threads=len(self.pool.threads), thread_busy=len(self.pool.busy),
+				thread_results=sum(len(win.thread_results) for win in self.wins),
+				pixbuf_cache_bytes=self.pool.cache_bytes,
+				buffer_pool_bytes=pooled, buffer_pool_hits=hits, buffer_pool_misses=misses,
+				buffer_pool_hit_rate=hits / (hits + misses) if hits + misses else 0 )
+		return gauges
+
+	def metrics_format(self):
+		fmt = getattr(self.metrics, f'format_{self.conf.misc_metrics_format}')
+		return fmt(self.metrics_gauges())
+
+	def metrics_dump(self):
+		sys.stderr.write(self.metrics_format())
+		sys.stderr.flush()
+		return True
+
+	def metrics_serve(self, path):
+		import socket, stat
+		try:
+			if stat.S_ISSOCK(os.stat(path).st_mode): os.unlink(path) # leftover from old pid
+		except FileNotFoundError: pass
+		self.metrics_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.metrics_sock.bind(path)
+		self.metrics_sock.listen()
+		self.metrics_sock.setblocking(False)
+		GLib.io_add_watch( self.metrics_sock.fileno(),
+			GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.metrics_send )
+
+	def metrics_send(self, fd, cond):
+		try: conn, addr = self.metrics_sock.accept()
+		except BlockingIOError: return True
+		with conn:
+			conn.settimeout(1.0)
+			try: conn.sendall(self.metrics_format().encode())
+			except OSError as err: log.warning('Failed to send metrics: {}', err)
+		return True
 
 
+def proc_priority_set(nice=0, ioprio='', cpus=None):
+	'''Lowers CPU/IO priority and sets CPU affinity for calling thread, if specified.
+		Linux-specific, as niceness and I/O priority are per-thread there.'''
+	tid = threading.get_native_id()
+	try:
+		if nice: os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + nice)
+		if cpus: os.sched_setaffinity(tid, cpus)
+	except OSError as err: log.warning('Failed to set thread nice/affinity: {}', err)
+	if not ioprio: return
+	import ctypes, platform
+	sys_n = dict(x86_64=251, i686=289, armv7l=314).get(platform.machine(), 30) # 30 - asm-generic
+	ioprio = (3 << 13) if ioprio == 'idle' else ((2 << 13) | int(ioprio)) # IOPRIO_CLASS_IDLE/BE
+	if ctypes.CDLL(None, use_errno=True).syscall(sys_n, 1, tid, ioprio) != 0: # IOPRIO_WHO_PROCESS
+		log.warning('Failed to set thread I/O priority: {}', os.strerror(ctypes.get_errno()))
+
+
+def startup_timing(stage, _ts=[time.monotonic()]):
+	'Logs time since module import or previous call, for startup timing under --debug.'
+	ts = time.monotonic()
+	log.debug('Startup timing: {} [{:,.1f} ms]', stage, (ts - _ts[0]) * 1e3)
+	_ts[0] = ts
+
+def pixbuf_from_bytes(buff):
+	loader = GdkPixbuf.PixbufLoader()
+	# pygobject only passes bytes as-is, converting any other buffers (e.g. mmap) per-item
+	loader.write(buff if isinstance(buff, bytes) else bytes(buff))
+	loader.close()
+	if not (pb := loader.get_pixbuf()): raise ValueError('No image data in a buffer')
+	return pb
+
+def pixbuf_size(src, chunk=2**16):
+	'''Returns (w, h) of image from file path or bytes-like buffer,
+		parsing only its header, or (0, 0) if it cannot be determined.'''
+	if isinstance(src, str):
+		fmt, w, h = GdkPixbuf.Pixbuf.get_file_info(src)
+		return (w, h) if fmt else (0, 0)
+	sz, loader = [0, 0], GdkPixbuf.PixbufLoader()
+	loader.connect('size-prepared', lambda loader, w, h: sz.__setitem__(slice(None), [w, h]))
+	try:
+		for n in range(0, len(src), chunk):
+			loader.write(src[n:n + chunk])
+			if sz[0]: break
+	except GLib.Error: pass
+	try: loader.close()
+	except GLib.Error: pass # incomplete image
+	return tuple(sz)
+
 def shuffle_iter(src_paths, crop_ratio=0.25):
 	src_paths, used = list(src_paths), 0
 	while len(src_paths) > used:
@@ -654,13 +1473,22 @@ def file_iter(src_paths):
 			log.warning('Path does not exists: {}', path)
 			continue
 		if path.is_dir():
-			for root, dirs, files in os.walk(str(path)):
-				root = pl.Path(root)
-				for fn in files: yield str(root / fn)
-		else: yield str(path)
-
-
-def main(args=None, conf=None):
+			for p in DirIndex.iter(str(path)): yield from archive_iter(p)
+		else: yield from archive_iter(str(path))
+
+def archive_iter(path):
+	'Yields ArchivePath for each file in zip/tar archive, or path itself for other files.'
+	if path.rsplit('.', 1)[-1].lower() not in ArchiveIndex.types:
+		yield path
+		return
+	try: members = ArchiveIndex.get(path).members
+	except Exception as err:
+		return log.warning( 'Failed to read archive'
+			' index: {} [{}] {}', path, err.__class__.__name__, err )
+	for member in members: yield ArchivePath(path, member)
+
+
+def main(args=None, conf=None, conf_reload=False):
 	if not conf: conf = ScrollerConf()
 	scale_algos = 'bilinear hyper nearest tiles'.split()
 
@@ -675,18 +1503,24 @@ def main(args=None, conf=None):
 			(will be searched recursively) to display images from.
 		All found files will be treated as images,
 			use e.g. find/grep/xargs for filename-based filtering.
+		Files with zip/cbz/tar/cbt extensions are treated as archives,
+			with images read from them directly, without unpacking to disk.
 		If no paths are provided, current
-			directory is used by default. See also --file-list option.'''))
+			directory is used by default. See also --file-list option.
+		With multiple -p/--pos windows, paths can be prefixed by window number
+			and colon (e.g. "2:path/to/dir") to only be used for that window,
+			with all non-prefixed paths used as separate sources for each window.'''))
 	group.add_argument('-f', '--file-list', metavar='path', help=dd('''
 		File with a list of image files/dirs paths to use, separated by newlines.
-		Can be a fifo or pipe, use "-" to read it from stdin.'''))
+		Can be a fifo or pipe, use "-" to read it from stdin.
+		Paths from it are distributed between windows, if there are multiple ones.'''))
 	group.add_argument('-r', '--shuffle', action='store_true', help=dd('''
 		Read full list of input images
 			(dont use infinite --file-list) and shuffle it.'''))
 	group.add_argument('-l', '--loop', action='store_true', help=dd('''
 		Loop (pre-buffered) input list of images infinitely.
-		Will re-read any dirs in image_path on each loop cycle,
-			and reshuffle files if -r/--shuffle is also specified.'''))
+		Will re-read any dirs in image_path on each loop cycle (or re-use their listings,
+			if mtimes of all subdirs are unchanged), and reshuffle files if -r/--shuffle is used.'''))
 	group.add_argument('--loop-files-wait',
 		type=float, metavar='seconds', default=3.0, help=dd('''
 			Number of seconds to wait between loop iterations/checks, if -l/--loop
@@ -694,28 +1528,35 @@ def main(args=None, conf=None):
 			Setting this to 0 or negative number will stop checking paths for images instead.'''))
 
 	group = parser.add_argument_group('Image processing')
-	group.add_argument('-z', '--scaling-interp',
-		default=scale_algos[0], metavar='algo', help=dd(f'''
+	group.add_argument('-z', '--scaling-interp', metavar='algo', help=dd(f'''
 			Interpolation algorithm to use to scale images to window size.
-			Supported ones: {", ".join(scale_algos)}. Default: %(default)s.
+			Supported ones: {", ".join(scale_algos)}.
+			Default is to use image-scale-algo option from config file ({scale_algos[0]}).
 			Can be specified by full name, prefix\
 				(e.g. "h" for "hyper") or digit (1={scale_algos[0]}).'''))
 	group.add_argument('-b', '--brightness', type=float, metavar='float', help=dd('''
 		Adjust brightness of images before displaying them via HSP algorithm,
 			multiplying P by specified coefficient value (>1 - brighter, <1 - darker).
 		For more info on HSP, see http://alienryderflex.com/hsp.html
-		Requires compiled pixbuf_proc.so module importable somewhere, e.g. same dir as script.'''))
+		Requires compiled pixbuf_proc.so module importable somewhere, e.g. same dir as script,
+			or numpy module for slower pixbuf_proc_py.py fallback.'''))
 	group.add_argument('-B', '--brightness-adapt', metavar='(+/-)(0-1.0)', help=dd('''
 		Dynamically adjust brightness of each image if average (median)
 			HSP pixel brightness value is below specified argument within 0-1 range.
 		Adjustment is done before -b/--brightness,
 			and uses "target / average" coefficient for each pixel.
 		Value can be prefixed by + or - to only adjust brightness in one direction (+/up, -/down).
-		Requires compiled pixbuf_proc.so module importable somewhere, e.g. same dir as script.'''))
-	group.add_argument('-m', '--proc-threads', type=int, metavar='n', help=dd('''
+		Requires compiled pixbuf_proc.so module importable somewhere, e.g. same dir as script,
+			or numpy module for slower pixbuf_proc_py.py fallback.'''))
+	group.add_argument('-m', '--proc-threads', metavar='[min:]max', help=dd('''
 		Number of background threads to use for loading and processing images.
-		Requires pixbuf_proc.so module to be loaded if value is specified,
-			and otherwise defaults to 0, which will translate to CPU thread count.'''))
+		Requires pixbuf_proc.so or pixbuf_proc_py.py (worker processes)
+			module to be loaded if value is specified, and otherwise
+			defaults to 0, which will translate to CPU thread count.
+		Threads are started as needed when images are queued, up to max number,
+			and exit after being idle for a while, down to min number (default=1).
+		These run with lowered CPU/IO priority and optional CPU affinity,
+			set via "image-proc-nice", "image-proc-ioprio" and "image-proc-cpus" ini options.'''))
 
 	group = parser.add_argument_group('Scrolling')
 	group.add_argument('-d', '--scroll-direction', metavar='direction', help=dd(f'''
@@ -742,7 +1583,7 @@ def main(args=None, conf=None):
 		Opacity of the window contents - float value in 0-1.0 range,
 			with 0 being fully-transparent and 1.0 fully opaque.
 		Should only have any effect with compositing Window Manager.'''))
-	group.add_argument('-p', '--pos', metavar='(WxH)(+X)(+Y)', help=dd('''
+	group.add_argument('-p', '--pos', metavar='(WxH)(+X)(+Y)', action='append', help=dd('''
 		Set window size and/or position hints for WM (usually followed).
 		W/H values can be special "S" to use screen size,
 			e.g. "SxS" (or just "S") is "fullscreen".
@@ -756,7 +1597,9 @@ def main(args=None, conf=None):
 		Examples: 800x600, -0+0 (move to top-right corner),
 			S (full screen), 200xS+0, M2 (full monitor 2), M2+M1, M2x500+M1+524.
 		"slop" tool - https://github.com/naelstrof/slop - can be used
-			used to get this value interactively via mouse selection (e.g. "-p $(slop)").'''))
+			used to get this value interactively via mouse selection (e.g. "-p $(slop)").
+		Can be specified multiple times to open multiple windows (e.g. -p M1 -p M2),
+			all sharing same image processing threads and cache in one process.'''))
 	group.add_argument('-s', '--spacing', type=int, metavar='px',
 		help=f'Padding between images, in pixels. Default: {conf.misc_box_spacing}px.')
 	group.add_argument('-x', '--wm-hints', metavar='(+|-)hint(,...)', help=dd('''
@@ -806,6 +1649,18 @@ def main(args=None, conf=None):
 			I.e. exit immediately if another app instance is already running.'''))
 	group.add_argument('--dump-css', action='store_true',
 		help='Print css that is used for windows by default and exit.')
+	group.add_argument('--metrics-socket', metavar='path', help=dd('''
+		Unix socket path to serve runtime metrics on - image queue/thread states,
+			decode/scale/brightness latency histograms, failure and dropped-frame counters.
+		Each connection to it gets current metrics dump, e.g. "nc -U path".
+		Same metrics are also dumped to stderr on SIGUSR2 signal, regardless of this option.'''))
+	group.add_argument('--metrics-format', metavar='fmt', choices=['json', 'prom'], help=dd('''
+		Format for metrics dumps - "json" (default) or "prom" for prometheus text format.'''))
+	group.add_argument('--trace', metavar='file', help=dd('''
+		Write Chrome/Perfetto trace-event JSON to specified file, with timing spans for
+			source-path scanning, queue wait, image loading/processing stages on per-thread
+			tracks, as well as whole lifecycle of each image, from path being picked to first draw.
+		Trace file can be opened in https://ui.perfetto.dev/ or chrome://tracing pages.'''))
 	group.add_argument('--quiet', action='store_true', help='Disable warning/error logging.')
 	group.add_argument('--debug', action='store_true', help='Verbose operation mode.')
 
@@ -820,6 +1675,7 @@ def main(args=None, conf=None):
 		format='%(asctime)s :: %(levelname)s :: %(message)s',
 		datefmt='%Y-%m-%d %H:%M:%S', level=log )
 	log = get_logger('main')
+	startup_timing('python init and args')
 
 	if opts.conf_dump_defaults: return conf.pprint('Default configuration options')
 	conf_user_paths = opts.conf or list()
@@ -832,22 +1688,9 @@ def main(args=None, conf=None):
 	conf.update_from_files(*conf_user_paths, home_lookups=conf_home_lookups)
 	if opts.conf_dump: return conf.pprint('Current configuration file(s) options')
 	if opts.dump_css: return print(conf._win_css.replace('\t', '  '), end='')
+	startup_timing('conf files')
 
-	src_paths = opts.image_path or list()
-	if opts.file_list:
-		if src_paths: parser.error('Either --file-list or image_path args can be specified, not both.')
-		src_file = pl.Path(opts.file_list).open() if opts.file_list != '-' else sys.stdin
-		src_paths = iter(lambda: src_file.readline().rstrip('\r\n').strip('\0'), '')
-	elif not src_paths: src_paths.append('.')
-
-	if opts.shuffle: random.seed()
-	if opts.loop:
-		src_func = lambda s=list(src_paths): file_iter(s)
-		if opts.shuffle: src_func = lambda f=src_func: shuffle_iter(f())
-		src_paths_iter = loop_iter(src_func, opts.loop_files_wait)
-	elif opts.shuffle: src_paths_iter = shuffle_iter(file_iter(src_paths))
-	else: src_paths_iter = file_iter(src_paths)
-
+	win_pos_list = opts.pos or [conf.win_pos]
 	if opts.scaling_interp:
 		algo = opts.scaling_interp.strip().lower()
 		if algo not in scale_algos:
@@ -879,20 +1722,22 @@ def main(args=None, conf=None):
 			break
 		else: parser.error(f'Unrecognized -d/--scroll-direction value: {conf.scroll_direction}')
 
-	if opts.pos or conf.win_pos:
-		if opts.pos: conf.win_pos = opts.pos
+	win_geoms = list()
+	for win_pos in win_pos_list:
+		win_geoms.append(geom := dict(win_pos=win_pos))
+		if not win_pos: continue
 		m = re.fullmatch(
 			r'((?:M?\d+|S)(?:x(?:M?\d+|S))?)?'
-			r'([-+]M?\d+)?([-+]M?\d+)?', conf.win_pos )
-		if not m: parser.error(f'Invalid size/position spec: {conf.win_pos!r}')
+			r'([-+]M?\d+)?([-+]M?\d+)?', win_pos )
+		if not m: parser.error(f'Invalid size/position spec: {win_pos!r}')
 		size, x, y = m.groups()
-		size_fs = size if 'x' not in size else None
+		size_fs = size if size and 'x' not in size else None
 		if size:
 			if size_fs: size = f'{size}x{size}'
-			conf.win_w, conf.win_h = size.split('x', 1)
-		if x: conf.win_x = x
-		if y: conf.win_y = y
-		if size_fs and not (x or y): conf.win_x = conf.win_y = size_fs
+			geom['win_w'], geom['win_h'] = size.split('x', 1)
+		if x: geom['win_x'] = x
+		if y: geom['win_y'] = y
+		if size_fs and not (x or y): geom['win_x'] = geom['win_y'] = size_fs
 
 	if opts.queue:
 		try: qs, q_pos = opts.queue.split(':', 1)
@@ -908,19 +1753,36 @@ def main(args=None, conf=None):
 
 	if opts.wm_type_hints or conf.win_type_hints or True:
 		hints = opts.wm_type_hints or conf.win_type_hints
-		conf.win_type_hints = Gdk.WindowTypeHint.NORMAL
+		conf.win_type_hints = 0 # normal
 		for k in hints.replace(',', ' ').lower().split():
 			conf.win_type_hints |= conf._win_type_hints_all[k]
 
-	conf.image_scale_algo = getattr(
-		GdkPixbuf.InterpType, (opts.scaling_interp or conf.image_scale_algo).upper() )
+	if opts.scaling_interp: conf.image_scale_algo = opts.scaling_interp
 	if opts.icon_name: conf.win_icon = opts.icon_name
+	ArchiveIndex.cache_size = conf.image_archive_cache
+	DirIndex.ttl = conf.image_dir_index_ttl
+	if opts.metrics_socket: conf.misc_metrics_socket = opts.metrics_socket
+	if opts.metrics_format: conf.misc_metrics_format = opts.metrics_format
+	if conf.misc_metrics_format not in ['json', 'prom']:
+		parser.error(f'Unrecognized metrics format: {conf.misc_metrics_format!r}')
 	if opts.spacing is not None: conf.misc_box_spacing = opts.spacing
 	if opts.opacity is not None: conf.image_opacity = opts.opacity
 	if opts.brightness is not None:
 		conf.image_brightness = opts.brightness
 		if conf.image_brightness < 0: parser.error('-b/--brightness value must be >0')
-	if opts.proc_threads is not None: conf.image_proc_threads = opts.proc_threads
+	if opts.proc_threads is not None:
+		if not (m := re.fullmatch(r'(?:(\d+):)?(\d+)', opts.proc_threads)):
+			parser.error(f'Invalid -m/--proc-threads value: {opts.proc_threads!r}')
+		if m[1]: conf.image_proc_threads_min = int(m[1])
+		conf.image_proc_threads = int(m[2])
+	if conf.image_proc_ioprio not in ['', 'idle', *map(str, range(8))]:
+		parser.error(f'Invalid image-proc-ioprio value: {conf.image_proc_ioprio!r}')
+	if conf.image_proc_cpus:
+		try:
+			conf._image_proc_cpus = set(it.chain.from_iterable(
+				range(int(a), int(b or a) + 1) for a, _, b in
+				(c.strip().partition('-') for c in conf.image_proc_cpus.split(',')) ))
+		except ValueError: parser.error(f'Invalid image-proc-cpus value: {conf.image_proc_cpus!r}')
 	if opts.no_register_session is not None: conf.misc_no_session = opts.no_register_session
 	if not opts.unique: conf.misc_app_id += '.pid-{pid}'
 
@@ -933,19 +1795,77 @@ def main(args=None, conf=None):
 			parser.error('-B/--brightness-adapt value without prefix must be in 0-1.0 range')
 	else: conf._image_brightness_adapt_k = conf._image_brightness_adapt_dir = 0
 
-	try:
-		import pixbuf_proc, threading, queue
-		conf._image_proc_module = pixbuf_proc, threading, queue
+	try: import pixbuf_proc
 	except ImportError:
-		if ( conf.image_brightness != 1.0 or
-				conf._image_brightness_adapt_k or conf.image_proc_threads ):
-			parser.error( 'pixbuf_proc.so module cannot be loaded, but is required'
-				' with specified options - build it from pixbuf_proc.c in same repo as this script' )
-	else:
+		pixbuf_proc = None
+		if conf.image_proc_py_pool:
+			try: import pixbuf_proc_py as pixbuf_proc
+			except ImportError: pass
+	if ( (conf.image_brightness != 1.0 or conf._image_brightness_adapt_k)
+			and not (pixbuf_proc and getattr(pixbuf_proc, 'has_brightness', True)) ):
+		parser.error( 'pixbuf_proc.so module cannot be loaded, but is required'
+			' with specified options - build it from pixbuf_proc.c in same repo as this script'
+			' (or install numpy module to use slower pixbuf_proc_py.py fallback)' )
+	if pixbuf_proc:
 		if not conf.image_proc_threads: conf.image_proc_threads = os.cpu_count()
+		conf.image_proc_threads_min = max(0, min(conf.image_proc_threads_min, conf.image_proc_threads))
+		if hasattr(pixbuf_proc, 'workers'):
+			pixbuf_proc.workers = conf.image_proc_threads
+			pixbuf_proc.worker_priority = ( conf.image_proc_nice,
+				conf.image_proc_ioprio, conf._image_proc_cpus )
+		conf._image_proc_module = pixbuf_proc
+	elif conf.image_proc_threads:
+		parser.error( 'Neither pixbuf_proc.so nor pixbuf_proc_py.py modules'
+			' can be loaded, but are required for -m/--proc-threads option' )
+
+	startup_timing('pixbuf_proc module')
+
+	gtk_import()
+	conf.image_scale_algo = getattr(GdkPixbuf.InterpType, conf.image_scale_algo.upper())
+	startup_timing('gtk import')
+	if conf_reload: return conf
+
+	src_paths_wins = list(list() for n in win_pos_list)
+	for p in opts.image_path or list():
+		if ( len(win_pos_list) > 1 and (m := re.fullmatch(r'(\d+):(.*)', p))
+				and 0 < (n := int(m[1])) <= len(win_pos_list) ): src_paths_wins[n-1].append(m[2])
+		else:
+			for src_paths in src_paths_wins: src_paths.append(p)
+	if opts.file_list:
+		if opts.image_path:
+			parser.error('Either --file-list or image_path args can be specified, not both.')
+		src_file = pl.Path(opts.file_list).open() if opts.file_list != '-' else sys.stdin
+		src_paths_wins = [iter(lambda: src_file.readline().rstrip('\r\n').strip('\0'), '')]
+
+	if opts.shuffle: random.seed()
+	src_paths_iters = list()
+	for src_paths in src_paths_wins:
+		if not opts.file_list and not src_paths: src_paths.append('.')
+		if opts.loop:
+			src_func = lambda s=list(src_paths): file_iter(s)
+			if opts.shuffle: src_func = lambda f=src_func: shuffle_iter(f())
+			src_paths_iter = loop_iter(src_func, opts.loop_files_wait)
+		elif opts.shuffle: src_paths_iter = shuffle_iter(file_iter(src_paths))
+		else: src_paths_iter = file_iter(src_paths)
+		src_paths_iters.append(src_paths_iter)
+	if opts.file_list: # same list-file paths are distributed between windows
+		src_paths_iter, = src_paths_iters
+		if len(win_pos_list) > 1: src_paths_iter = LockedIter(src_paths_iter)
+		src_paths_iters = list(src_paths_iter for n in win_pos_list)
+
+	if opts.trace:
+		try: conf._trace = ScrollerTrace(opts.trace)
+		except OSError as err: parser.error(f'Failed to open --trace file: {err}')
+
+	windows = list()
+	for src_paths_iter, geom in zip(src_paths_iters, win_geoms):
+		windows.append((src_paths_iter, win_conf := copy.copy(conf)))
+		for k, v in geom.items(): setattr(win_conf, k, v)
 
 	log.debug('Starting application...')
-	ScrollerApp(src_paths_iter, conf).run()
+	try: ScrollerApp(windows, conf, ft.partial(main, args, conf_reload=True)).run()
+	finally:
+		if conf._trace: conf._trace.close()
 
 if __name__ == '__main__':
 	signal.signal(signal.SIGINT, signal.SIG_DFL)
@@ -11,6 +11,8 @@
 //  import pixbuf_proc
 //  buff, w, h, rs, alpha = pixbuf_proc\
 //    .process_image_file(path, max_w, max_h, scale_interp, brightness-opts...)
+//  # or .process_image_bytes(image_file_bytes, ...) with same other args,
+//  #  and optional preview callback for early low-res frame of large images
 //  pb = GdkPixbuf.Pixbuf.new_from_data(
 //    buff, GdkPixbuf.Colorspace.RGB, alpha, 8, w, h, rs )
 //
@@ -19,6 +21,9 @@
 #define __STDC_WANT_LIB_EXT2__ 1 // for asprintf
 #include <stdio.h>
 #include <math.h>
+#ifdef __GLIBC__
+#include <malloc.h> // malloc_trim
+#endif
 
 #include "gdk-pixbuf/gdk-pixbuf.h"
 
@@ -104,44 +109,349 @@ int pp_qsort_comp(const void *va, const void *vb) {
 	double a = *(double *) va; double b = *(double *) vb;
 	return a < b ? -1 : a > b ? 1 : 0; }
 
-void pp_brightness( unsigned char *buff,
-		unsigned int buff_len, int alpha, double k, int ad, double ak ) {
-	if (k == 1.0 && ak <= 0) return;
+
+// Size-class pool of pixel buffers, reused for scaled pixbufs.
+// Avoids constant multi-MB malloc/free of varying sizes in long-running
+//  processes, which fragments heap and slowly pushes RSS up over time.
+// Decode buffers are allocated by gdk-pixbuf loaders and exported bytes by python,
+//  so can't be pooled here, and are only returned to OS by malloc_trim() on trim.
+// Classes are 1 MiB * 2^(n/4), free lists are linked through first bytes of each buffer.
+
+#define PP_POOL_CLASSES 48
+#define PP_POOL_MIN_SHIFT 20
+
+static GMutex pp_pool_lock;
+static size_t pp_pool_max = 0, pp_pool_size = 0;
+static unsigned long pp_pool_hits = 0, pp_pool_misses = 0;
+static void *pp_pool_free[PP_POOL_CLASSES];
+
+size_t pp_pool_class_size(int n) {
+	return ((size_t) 1 << (PP_POOL_MIN_SHIFT + n / 4)) / 4 * (4 + n % 4); }
+
+int pp_pool_class(size_t len) { // -1 for sizes that are not pooled
+	if (!pp_pool_max || len < ((size_t) 1 << PP_POOL_MIN_SHIFT)) return -1;
+	for (int n = 0; n < PP_POOL_CLASSES; n++) if (pp_pool_class_size(n) >= len) return n;
+	return -1; }
+
+unsigned char *pp_pool_get(size_t len, int *cls) {
+	unsigned char *buff = NULL;
+	if ((*cls = pp_pool_class(len)) < 0) return g_malloc(len);
+	g_mutex_lock(&pp_pool_lock);
+	if ((buff = pp_pool_free[*cls])) {
+		pp_pool_free[*cls] = *(void **) buff;
+		pp_pool_size -= pp_pool_class_size(*cls);
+		pp_pool_hits++; }
+	else pp_pool_misses++;
+	g_mutex_unlock(&pp_pool_lock);
+	return buff ? buff : g_malloc(pp_pool_class_size(*cls)); }
+
+void pp_pool_put(guchar *buff, gpointer data) {
+	int cls = GPOINTER_TO_INT(data) - 1;
+	if (cls >= 0) {
+		size_t sz = pp_pool_class_size(cls);
+		g_mutex_lock(&pp_pool_lock);
+		if (pp_pool_size + sz <= pp_pool_max) {
+			*(void **) buff = pp_pool_free[cls]; pp_pool_free[cls] = buff;
+			pp_pool_size += sz; buff = NULL; }
+		g_mutex_unlock(&pp_pool_lock); }
+	if (buff) g_free(buff); }
+
+GdkPixbuf *pp_pool_pixbuf(int alpha, int w, int h) {
+	int cls, rs = (w * (alpha ? 4 : 3) + 3) & ~3;
+	unsigned char *buff = pp_pool_get((size_t) rs * h, &cls);
+	return gdk_pixbuf_new_from_data( buff, GDK_COLORSPACE_RGB,
+		alpha, 8, w, h, rs, pp_pool_put, GINT_TO_POINTER(cls + 1) ); }
+
+size_t pp_pool_trim(void) {
+	size_t freed = 0; void *buff;
+	g_mutex_lock(&pp_pool_lock);
+	for (int n = 0; n < PP_POOL_CLASSES; n++)
+		while ((buff = pp_pool_free[n])) {
+			pp_pool_free[n] = *(void **) buff;
+			g_free(buff); freed += pp_pool_class_size(n); }
+	pp_pool_size = 0;
+	g_mutex_unlock(&pp_pool_lock);
+	#ifdef __GLIBC__
+	malloc_trim(0); // return free heap pages to OS
+	#endif
+	return freed; }
+
+
+// Row-band processing, to split huge images between several threads.
+// Caller always processes bands itself as well, and only uses pool threads
+//  that happen to pick up its job before all bands are done, so it never waits on idle ones.
+// Pool threads also stop picking up bands when other images start being processed,
+//  so that total number of busy threads stays within pp_band_threads + 1.
+
+static GThreadPool *pp_band_pool = NULL;
+static int pp_band_threads = 0;
+static GMutex pp_band_pool_lock;
+static gint pp_workers_active = 0, pp_band_active = 0; // threads in process_image_* / bands
+
+typedef void (*pp_band_func)(void *ctx, int y0, int y1);
+
+typedef struct {
+	pp_band_func func; void *ctx;
+	int h, band_h; gint n, next, done, refs;
+	GMutex lock; GCond cond;
+} pp_band_job;
+
+void pp_band_job_unref(pp_band_job *job) {
+	if (!g_atomic_int_dec_and_test(&job->refs)) return;
+	g_mutex_clear(&job->lock); g_cond_clear(&job->cond); free(job); }
+
+void pp_band_job_work(pp_band_job *job, int helper) {
+	int n, y0;
+	while (1) {
+		if ( helper && g_atomic_int_get(&pp_workers_active)
+			+ g_atomic_int_get(&pp_band_active) > pp_band_threads + 1 ) break;
+		if ((n = g_atomic_int_add(&job->next, 1)) >= job->n) break;
+		y0 = n * job->band_h;
+		job->func(job->ctx, y0, MIN(job->h, y0 + job->band_h));
+		if (g_atomic_int_add(&job->done, 1) + 1 < job->n) continue;
+		g_mutex_lock(&job->lock); g_cond_broadcast(&job->cond); g_mutex_unlock(&job->lock); } }
+
+void pp_band_pool_thread(gpointer data, gpointer user_data) {
+	g_atomic_int_inc(&pp_band_active);
+	pp_band_job_work(data, 1);
+	g_atomic_int_add(&pp_band_active, -1);
+	pp_band_job_unref(data); }
+
+void pp_bands_run(pp_band_func func, void *ctx, int h, int bands) {
+	// Pool is exclusive, with all threads started right away by g_thread_pool_new(),
+	//  and created lazily from worker thread, so that its threads inherit worker priority.
+	// Shared glib pool threads are not used, as these are started elsewhere and run GTask jobs.
+	if (bands > 1 && pp_band_threads > 0 && !pp_band_pool) {
+		g_mutex_lock(&pp_band_pool_lock);
+		if (!pp_band_pool) pp_band_pool = g_thread_pool_new(
+			pp_band_pool_thread, NULL, pp_band_threads, TRUE, NULL );
+		g_mutex_unlock(&pp_band_pool_lock); }
+	if (bands > pp_band_threads + 1) bands = pp_band_threads + 1;
+	if (bands <= 1 || !pp_band_pool) { func(ctx, 0, h); return; }
+
+	pp_band_job *job = calloc(1, sizeof(pp_band_job));
+	if (!job) { func(ctx, 0, h); return; }
+	job->func = func; job->ctx = ctx; job->h = h;
+	job->n = bands * 4; // smaller bands to balance uneven/late starts
+	job->band_h = (h + job->n - 1) / job->n;
+	if (job->band_h < 16) job->band_h = 16;
+	job->n = (h + job->band_h - 1) / job->band_h;
+	job->refs = 1;
+	g_mutex_init(&job->lock); g_cond_init(&job->cond);
+
+	for (int n = 1; n < bands && n < job->n; n++) {
+		g_atomic_int_inc(&job->refs);
+		if (!g_thread_pool_push(pp_band_pool, job, NULL)) pp_band_job_unref(job); }
+	pp_band_job_work(job, 0);
+	g_mutex_lock(&job->lock);
+	while (g_atomic_int_get(&job->done) < job->n) g_cond_wait(&job->cond, &job->lock);
+	g_mutex_unlock(&job->lock);
+	pp_band_job_unref(job); }
+
+
+typedef struct {
+	unsigned char *buff; int rs, row_len, step;
+	double k, ak;
+} pp_brightness_ctx;
+
+double pp_brightness_adapt_k(pp_brightness_ctx *ctx, int w, int h, int ad, double ak) {
+	// Calcs median (average) of up to sc evenly-sampled pixels
+	double hh, s, p, pk, pks[1000];
+	int sc = 1000, sn = 0, px = w * h, ss = px / sc;
+	unsigned char *bs;
+	if (ss < 1) ss = 1;
+	for (int n = 0; n < px && sn < sc; n += ss) {
+		bs = ctx->buff + (n / w) * ctx->rs + (n % w) * ctx->step;
+		RGBtoHSP(bs[0], bs[1], bs[2], &hh, &s, &p);
+		pks[sn++] = p / 255; }
+	qsort(pks, sn, sizeof(pk), pp_qsort_comp);
+	pk = pks[sn / 2];
+	if (pk <= 0) return 0;
+	return ( ad == PP_BA_BOTH
+		|| (ad == PP_BA_UP && pk < ak)
+		|| (ad == PP_BA_DOWN && pk > ak) ) ? ak / pk : 0; }
+
+void pp_brightness_rows(void *vctx, int y0, int y1) {
+	pp_brightness_ctx *ctx = vctx;
 	double r, g, b, h, s, p;
-	unsigned char *end = buff + buff_len;
-	int buff_step = alpha ? 4 : 3;
-
-	if (ak > 0) {
-		// Calcs median (average) of sc evenly-sampled pixels
-		int sc = 1000, sn = 0, sp = sc / 2, ss = buff_len / buff_step;
-		if (sc < ss) ss = round(ss / sc);
-		else { sp = ss / 2; ss = buff_step; }
-		double pk, pks[sc]; unsigned char *bs = buff;
-		while (sn < sc && bs < end) {
-			RGBtoHSP(bs[0], bs[1], bs[2], &h, &s, &p);
-			pks[sn++] = p / 255; bs += ss; }
-		qsort(pks, sc, sizeof(pk), pp_qsort_comp);
-		pk = pks[sp];
-		ak = ( ad == PP_BA_BOTH
-			|| (ad == PP_BA_UP && pk < ak)
-			|| (ad == PP_BA_DOWN && pk > ak) ) ? ak / pk : 0; }
-
-	while (buff < end) {
-		r = buff[0]; g = buff[1]; b = buff[2];
-		RGBtoHSP(r, g, b, &h, &s, &p);
-		if (ak) p *= ak;
-		p *= k;
-		HSPtoRGB(h, s, p, &r, &g, &b);
-		buff[0] = r; buff[1] = g; buff[2] = b;
-		buff += buff_step; }
+	unsigned char *buff, *end;
+	for (int y = y0; y < y1; y++) {
+		buff = ctx->buff + y * ctx->rs; end = buff + ctx->row_len;
+		while (buff < end) {
+			r = buff[0]; g = buff[1]; b = buff[2];
+			RGBtoHSP(r, g, b, &h, &s, &p);
+			if (ctx->ak) p *= ctx->ak;
+			p *= ctx->k;
+			HSPtoRGB(h, s, p, &r, &g, &b);
+			buff[0] = r; buff[1] = g; buff[2] = b;
+			buff += ctx->step; } } }
+
+void pp_brightness( GdkPixbuf *pb,
+		double k, int ad, double ak, int ak_rows, int bands, int band_px ) {
+	// ak_rows > 0 limits adapt-k median to first rows, e.g. decoded part of preview frame
+	if (k == 1.0 && ak <= 0) return;
+	int w = gdk_pixbuf_get_width(pb), h = gdk_pixbuf_get_height(pb);
+	pp_brightness_ctx ctx = { .buff=gdk_pixbuf_get_pixels(pb),
+		.rs=gdk_pixbuf_get_rowstride(pb), .step=gdk_pixbuf_get_n_channels(pb), .k=k };
+	ctx.row_len = w * ctx.step;
+	if (ak > 0) ctx.ak = pp_brightness_adapt_k(
+		&ctx, w, ak_rows > 0 ? MIN(h, ak_rows) : h, ad, ak );
+	if (band_px <= 0 || w * h < band_px) bands = 1;
+	pp_bands_run(pp_brightness_rows, &ctx, h, bands); }
+
+
+typedef struct {
+	GdkPixbuf *src, *dst; double sx, sy; int interp;
+} pp_scale_ctx;
+
+void pp_scale_rows(void *vctx, int y0, int y1) {
+	pp_scale_ctx *ctx = vctx;
+	gdk_pixbuf_scale( ctx->src, ctx->dst, 0, y0,
+		gdk_pixbuf_get_width(ctx->dst), y1 - y0, 0, 0, ctx->sx, ctx->sy, ctx->interp ); }
+
+GdkPixbuf *pp_scale(GdkPixbuf *src, int w, int h, int interp, int bands, int band_px) {
+	if (band_px <= 0 || w * h < band_px) bands = 1;
+	if (bands <= 1 && !pp_pool_max) return gdk_pixbuf_scale_simple(src, w, h, interp);
+	pp_scale_ctx ctx = { .src=src, .interp=interp,
+		.dst=pp_pool_pixbuf(gdk_pixbuf_get_has_alpha(src), w, h),
+		.sx=(double) w / gdk_pixbuf_get_width(src),
+		.sy=(double) h / gdk_pixbuf_get_height(src) };
+	if (ctx.dst) pp_bands_run(pp_scale_rows, &ctx, h, bands);
+	return ctx.dst; }
+
+
+static PyObject *
+pp_set_band_threads(PyObject *self, PyObject *args) {
+	int n;
+	if (!PyArg_ParseTuple(args, "i", &n)) return NULL;
+	if (n < 0) n = 0;
+	g_mutex_lock(&pp_band_pool_lock);
+	pp_band_threads = n;
+	if (pp_band_pool && n > 0) g_thread_pool_set_max_threads(pp_band_pool, n, NULL);
+	g_mutex_unlock(&pp_band_pool_lock);
+	Py_RETURN_NONE;
+}
+
+static PyObject *
+pp_buffer_pool(PyObject *self, PyObject *args) {
+	unsigned long long max_bytes;
+	if (!PyArg_ParseTuple(args, "K", &max_bytes)) return NULL;
+	g_mutex_lock(&pp_pool_lock);
+	pp_pool_max = max_bytes;
+	g_mutex_unlock(&pp_pool_lock);
+	Py_RETURN_NONE;
+}
+
+static PyObject *
+pp_buffer_pool_trim(PyObject *self, PyObject *args) {
+	size_t freed;
+	Py_BEGIN_ALLOW_THREADS
+	freed = pp_pool_trim();
+	Py_END_ALLOW_THREADS
+	return PyLong_FromSize_t(freed);
 }
 
 static PyObject *
-pp_process_image_file(PyObject *self, PyObject *args) {
-	char *path; int w, h, scale_interp; double brightness_k;
+pp_buffer_pool_stats(PyObject *self, PyObject *args) {
+	g_mutex_lock(&pp_pool_lock);
+	PyObject *res = Py_BuildValue( "(nkk)",
+		(Py_ssize_t) pp_pool_size, pp_pool_hits, pp_pool_misses );
+	g_mutex_unlock(&pp_pool_lock);
+	return res;
+}
+
+// Stage timestamps, in same CLOCK_MONOTONIC microseconds as g_get_monotonic_time()
+
+typedef struct { const char *name; gint64 t0, t1; } pp_stage;
+
+#define PP_STAGE(st, st_n, stage_name, ...) { \
+	st[st_n].name = stage_name; st[st_n].t0 = g_get_monotonic_time(); \
+	__VA_ARGS__; st[st_n++].t1 = g_get_monotonic_time(); }
+
+static PyObject *pp_stages_tuple(pp_stage *st, int st_n) {
+	PyObject *res = PyTuple_New(st_n), *v;
+	if (!res) return NULL;
+	for (int n = 0; n < st_n; n++) {
+		if (!(v = Py_BuildValue("(sLL)", st[n].name, st[n].t0, st[n].t1)))
+			{ Py_DECREF(res); return NULL; }
+		PyTuple_SET_ITEM(res, n, v); }
+	return res; }
+
+
+// Progressive decoding preview - one early frame with already-decoded part of the image,
+//  scaled with nearest-neighbor interpolation, passed to python callback from loader thread
+
+typedef struct {
+	PyObject *cb; gint64 ts, delay; int y1, done;
+	int w, h; double bk; int bad; double bak;
+} pp_preview;
+
+static void pp_preview_area( GdkPixbufLoader *loader,
+		int x, int y, int w, int h, pp_preview *pv ) {
+	if (y + h > pv->y1) pv->y1 = y + h; // interlaced/progressive passes start from 0 again
+	if (pv->done || g_get_monotonic_time() - pv->ts < pv->delay) return;
+	pv->done = 1;
+
+	GdkPixbuf *src = gdk_pixbuf_loader_get_pixbuf(loader), *dst;
+	if (!src) return;
+	int src_w = gdk_pixbuf_get_width(src), src_h = gdk_pixbuf_get_height(src);
+	w = pv->w; h = pv->h;
+	if (w <= 0 && h <= 0) { w = src_w; h = src_h; }
+	else if (w <= 0) w = src_w * (double) h / (double) src_h;
+	else if (h <= 0) h = src_h * (double) w / (double) src_w;
+	if (!(dst = gdk_pixbuf_new( GDK_COLORSPACE_RGB,
+		gdk_pixbuf_get_has_alpha(src), 8, w, h ))) return;
+	gdk_pixbuf_fill(dst, 0);
+	if ((y = MIN(h, pv->y1 * (double) h / src_h)) > 0)
+		gdk_pixbuf_scale( src, dst, 0, 0, w, y, 0, 0,
+			(double) w / src_w, (double) h / src_h, GDK_INTERP_NEAREST );
+	if (y > 0) pp_brightness(dst, pv->bk, pv->bad, pv->bak, y, 1, 0);
+
+	guint buff_len; guchar *buff = gdk_pixbuf_get_pixels_with_length(dst, &buff_len);
+	PyGILState_STATE gil = PyGILState_Ensure();
+	PyObject *res = PyObject_CallFunction( pv->cb, "y#iiib", (char *) buff,
+		(Py_ssize_t) buff_len, w, h, gdk_pixbuf_get_rowstride(dst), gdk_pixbuf_get_has_alpha(dst) );
+	if (res) Py_DECREF(res); else PyErr_WriteUnraisable(pv->cb);
+	PyGILState_Release(gil);
+	g_object_unref(dst); }
+
+
+static GdkPixbuf *pp_load_bytes( const guchar *src,
+		gsize src_len, pp_preview *pv, GError **gerr ) {
+	// Feeds loader in chunks, so that it can start decoding before all data is copied
+	GdkPixbuf *pb = NULL; gsize chunk = 1 << 20; int ok = 1;
+	GdkPixbufLoader *loader = gdk_pixbuf_loader_new();
+	if (pv) {
+		pv->ts = g_get_monotonic_time();
+		g_signal_connect(loader, "area-updated", G_CALLBACK(pp_preview_area), pv); }
+	for (gsize n = 0; n < src_len; n += chunk)
+		if (!(ok = gdk_pixbuf_loader_write(loader, src + n, MIN(chunk, src_len - n), gerr))) break;
+	if (!gdk_pixbuf_loader_close(loader, ok ? gerr : NULL)) ok = 0;
+	if (ok && (pb = gdk_pixbuf_loader_get_pixbuf(loader))) g_object_ref(pb);
+	else if (ok) g_set_error_literal( gerr, GDK_PIXBUF_ERROR,
+		GDK_PIXBUF_ERROR_CORRUPT_IMAGE, "no image data in a buffer" );
+	g_object_unref(loader);
+	return pb; }
+
+static PyObject *
+pp_process_image(PyObject *args, int from_bytes) {
+	char *path = NULL; Py_buffer src = {0}; int w, h, scale_interp; double brightness_k;
 	int brightness_ad = 0; double brightness_ak = 0;
-	if (!PyArg_ParseTuple( args, "siiidid", &path, &w, &h,
-		&scale_interp, &brightness_k, &brightness_ad, &brightness_ak )) return NULL;
+	int bands = 1, band_px = 0, timings = 0;
+	PyObject *preview_cb = NULL; double preview_delay = 0;
+	if (!PyArg_ParseTuple( args, from_bytes ? "y*iiidid|iipOd" : "siiidid|iip",
+		from_bytes ? (void *) &src : (void *) &path, &w, &h,
+		&scale_interp, &brightness_k, &brightness_ad, &brightness_ak,
+		&bands, &band_px, &timings, &preview_cb, &preview_delay )) return NULL;
+	if (preview_cb == Py_None) preview_cb = NULL;
+	if (preview_cb && !PyCallable_Check(preview_cb)) {
+		PyErr_SetString(PyExc_TypeError, "preview must be callable or None");
+		PyBuffer_Release(&src);
+		return NULL; }
+	pp_preview pv = { .cb=preview_cb, .delay=preview_delay * 1e6, .w=w, .h=h,
+		.bk=brightness_k, .bad=brightness_ad, .bak=brightness_ak };
+
+	pp_stage st[5]; int st_n = 0, bright = brightness_k != 1.0 || brightness_ak > 0;
 
 	char *err = NULL; int err_n = 0;
 
@@ -155,11 +465,16 @@ pp_process_image_file(PyObject *self, PyObject *args) {
 	if (brightness_k < 0) {
 		err_n = asprintf(&err, "Brightness cannot be negative: %f", brightness_k);
 		PyErr_SetString(PyExc_ValueError, err);
+		free(err);
+		if (from_bytes) PyBuffer_Release(&src);
 		return NULL; }
 
 	Py_BEGIN_ALLOW_THREADS // -- no python stuff beyond this point
+	g_atomic_int_inc(&pp_workers_active);
 
-	pb = gdk_pixbuf_new_from_file(path, &gerr);
+	PP_STAGE( st, st_n, "load", pb = from_bytes ?
+		pp_load_bytes(src.buf, src.len, preview_cb ? &pv : NULL, &gerr)
+		: gdk_pixbuf_new_from_file(path, &gerr) );
 	if (!pb) {
 		err_n = asprintf(&err, "GdkPixbuf image load error - %s", gerr->message);
 		g_error_free(gerr);
@@ -176,31 +491,34 @@ pp_process_image_file(PyObject *self, PyObject *args) {
 	else if (h <= 0) h = pb_h * (double) w / (double) pb_w;
 	pb_rs = pb_w * pb_h > w * h; // rescale before pixel processing
 
-	if (pb_rs) {
-		buff = gdk_pixbuf_get_pixels_with_length(pb, &buff_len);
-		pp_brightness( buff, buff_len, pb_alpha,
-			brightness_k, brightness_ad, brightness_ak ); }
+	if (pb_rs && bright) PP_STAGE( st, st_n, "brightness",
+		pp_brightness(pb, brightness_k, brightness_ad, brightness_ak, 0, bands, band_px) );
 
 	if (pb_w != w || pb_h != h) {
 		pb_old = pb; pb_w = w; pb_h = h;
-		pb = gdk_pixbuf_scale_simple(pb_old, w, h, scale_interp);
+		PP_STAGE(st, st_n, "scale", pb = pp_scale(pb_old, w, h, scale_interp, bands, band_px));
 		g_object_unref(pb_old);
-		if (!pb) { err = "GdkPixbuf scaling error"; buff = NULL; goto end; }
-		buff = gdk_pixbuf_get_pixels_with_length(pb, &buff_len); }
+		if (!pb) { err = "GdkPixbuf scaling error"; goto end; } }
 
-	if (!pb_rs) {
-		if (!buff) buff = gdk_pixbuf_get_pixels_with_length(pb, &buff_len);
-		pp_brightness( buff, buff_len, pb_alpha,
-			brightness_k, brightness_ad, brightness_ak ); }
+	if (!pb_rs && bright) PP_STAGE( st, st_n, "brightness",
+		pp_brightness(pb, brightness_k, brightness_ad, brightness_ak, 0, bands, band_px) );
 
+	buff = gdk_pixbuf_get_pixels_with_length(pb, &buff_len);
 	pb_rs = gdk_pixbuf_get_rowstride(pb);
 
 	end:
+	g_atomic_int_add(&pp_workers_active, -1);
 	Py_END_ALLOW_THREADS // -- python stuff allowed again
 
-	if (buff)
-		res = Py_BuildValue( "(y#iiib)",
-			buff, buff_len, pb_w, pb_h, pb_rs, pb_alpha );
+	if (from_bytes) PyBuffer_Release(&src);
+	if (buff) {
+		PyObject *res_buff;
+		PP_STAGE( st, st_n, "export",
+			res_buff = PyBytes_FromStringAndSize((char *) buff, buff_len) );
+		if (res_buff && !timings) res = Py_BuildValue(
+			"(Niiib)", res_buff, pb_w, pb_h, pb_rs, pb_alpha );
+		else if (res_buff) res = Py_BuildValue( "(NiiibN)",
+			res_buff, pb_w, pb_h, pb_rs, pb_alpha, pp_stages_tuple(st, st_n) ); }
 	if (err) {
 		PyErr_SetString(pp_error, err);
 		if (err_n) free(err); }
@@ -209,13 +527,45 @@ pp_process_image_file(PyObject *self, PyObject *args) {
 	return res;
 }
 
+static PyObject *
+pp_process_image_file(PyObject *self, PyObject *args) { return pp_process_image(args, 0); }
+
+static PyObject *
+pp_process_image_bytes(PyObject *self, PyObject *args) { return pp_process_image(args, 1); }
+
 
 // Python C-API boilerplate
 
 static PyMethodDef pp_methods[] = {
 	{"process_image_file", pp_process_image_file, METH_VARARGS,
-		"process_image_file(path, max_w, max_h, scale_interp, brightness_k)"
-			" -> (buff, w, h, rs, alpha) - Load image and scale/process it."},
+		"process_image_file(path, max_w, max_h, scale_interp,"
+				" brightness_k, brightness_ad, brightness_ak[, bands, band_px, timings])"
+			" -> (buff, w, h, rs, alpha[, stages]) - Load image and scale/process it."
+			" Images over band_px pixels are split into row-bands,"
+			" processed by up to specified number of threads, see set_band_threads()."
+			" With timings=True, also returns ((stage, t0_us, t1_us), ...) tuple,"
+			" with CLOCK_MONOTONIC timestamps (same as python time.monotonic_ns)."},
+	{"process_image_bytes", pp_process_image_bytes, METH_VARARGS,
+		"process_image_bytes(buff, max_w, max_h, scale_interp,"
+				" brightness_k, brightness_ad, brightness_ak[, bands, band_px, timings])"
+			" -> (buff, w, h, rs, alpha[, stages]) - Same as process_image_file(),"
+			" but decodes image from bytes-like buffer, e.g. file read from an archive."
+			" Optional preview(buff, w, h, rs, alpha) callback gets called once from same thread,"
+			" with already-decoded part of the image, if decoding takes longer than"
+			" preview_delay seconds, with same scaling, but nearest-neighbor interpolation."},
+	{"set_band_threads", pp_set_band_threads, METH_VARARGS,
+		"set_band_threads(n) - Max number of shared helper threads"
+			" to use for processing row-bands of large images. Default: 0 (disabled)."
+			" These are started by first thread that processes large image, inheriting its"
+			" priority/affinity, and only help while total number of busy threads is <= n+1."},
+	{"buffer_pool", pp_buffer_pool, METH_VARARGS,
+		"buffer_pool(max_bytes) - Enable reusing buffers for scaled pixbufs,"
+			" keeping up to max_bytes of unused ones around. Default: 0 (disabled)."},
+	{"buffer_pool_trim", pp_buffer_pool_trim, METH_NOARGS,
+		"buffer_pool_trim() -> freed_bytes - Free all unused pooled buffers"
+			" and return free heap memory to OS, e.g. when idle."},
+	{"buffer_pool_stats", pp_buffer_pool_stats, METH_NOARGS,
+		"buffer_pool_stats() -> (pooled_bytes, hits, misses) - Buffer pool counters."},
 	{NULL, NULL, 0, NULL}
 };
 
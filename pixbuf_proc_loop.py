@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 
-import os, sys, threading, time, datetime as dt, operator as op
-import pixbuf_proc as pp
+import os, sys, re, threading, time, subprocess, statistics, json
+import itertools as it, datetime as dt, operator as op, pathlib as pl
+
+pp = None # pixbuf_proc or pixbuf_proc_py module, imported in main()
+
+interp_types = dict(nearest=0, tiles=1, bilinear=2, hyper=3) # GdkPixbuf.InterpType
+brightness_modes = dict( # name -> brightness_k, brightness_ad, brightness_ak
+	none=(1.0, 0, 0), k=(1.3, 0, 0), adapt=(1.0, 1, 0.5), both=(0.8, 2, 0.5) )
 
 
 def image_pixbuf_proc_thread(count, image_files):
@@ -14,7 +20,7 @@ def image_pixbuf_proc_thread(count, image_files):
 			count[0] += 1
 
 
-def run_proc_loop(image_files, stop_after, report_interval):
+def run_proc_loop(image_files, stop_after, report_interval, pool_mb=0):
 	proc_stat_file = open('/proc/self/stat')
 	proc_stat_fields = op.itemgetter(13, 14, 23, 22)
 	proc_stat_rss_page_bytes = os.sysconf(os.sysconf_names['SC_PAGE_SIZE'])
@@ -30,10 +36,12 @@ def run_proc_loop(image_files, stop_after, report_interval):
 		except IndexError: return None
 
 	ru0_user = ru0_sys = ru0_rss = ru0_vss = 0
+	rss_list = list()
 	def print_resource_usage():
 		ru = get_resource_usage()
 		if not ru: return
 		ru_user, ru_sys, ru_rss, ru_vss = ru
+		rss_list.append(ru_rss)
 		ru_user, ru_sys = ru_user - ru0_user, ru_sys - ru0_sys
 		ru_rss_diff, ru_vss_diff = ru_rss - ru0_rss, ru_vss - ru0_vss
 		ru_rss, ru_vss, ru_rss_diff, ru_vss_diff = (
@@ -43,6 +51,7 @@ def run_proc_loop(image_files, stop_after, report_interval):
 				f' mem-rss={ru_rss:,.1f}M [{ru_rss_diff:+,.1f}M]'
 				f' mem-vss={ru_vss:,.1f}M [{ru_vss_diff:+,.1f}M]\n' )
 
+	if pool_mb: pp.buffer_pool(int(pool_mb * 2**20))
 	image_count, threads = [0], list()
 	for n in range(os.cpu_count()):
 		threads.append(threading.Thread(
@@ -52,7 +61,7 @@ def run_proc_loop(image_files, stop_after, report_interval):
 
 	n, ts0 = 0, time.monotonic()
 	print( 'Started image-processing loop:'
-		f' images={len(image_files)} threads={len(threads)}'
+		f' images={len(image_files)} threads={len(threads)} buffer-pool={pool_mb:,.0f}M'
 		f' report-interval={report_interval:,.0f}s stop-after={stop_after:,.0f}s\n' )
 
 	while True:
@@ -67,21 +76,239 @@ def run_proc_loop(image_files, stop_after, report_interval):
 		if td >= stop_after: break
 		n += 1
 
+	# Steady-state = median over second half of reports, after initial allocations
+	if rss_list := rss_list[len(rss_list) // 2:]:
+		rss_ss = statistics.median(rss_list) / 2**20
+		print( f'Steady-state mem-rss: {rss_ss:,.1f}M'
+			f' [last={rss_list[-1] / 2**20:,.1f}M] buffer-pool={pool_mb:,.0f}M' )
+
+
+def run_pool_compare(args, pool_mb):
+	'Runs loop in separate processes without and with buffer pool, to compare their RSS.'
+	rss = dict()
+	for mb in 0, pool_mb:
+		print(f'--- Running loop subprocess with buffer-pool={mb:,.0f}M\n', flush=True)
+		proc = subprocess.run( [sys.executable, __file__, 'loop', *args, '-p', str(mb)],
+			stdout=subprocess.PIPE, text=True, check=True )
+		print(proc.stdout, end='', flush=True)
+		if m := re.search(r'(?m)^Steady-state mem-rss: ([\d,.]+)M', proc.stdout):
+			rss[mb] = float(m.group(1).replace(',', ''))
+	if len(rss) != 2: return print('--- Failed to get steady-state RSS from loop subprocesses')
+	print( f'--- Steady-state mem-rss: no-pool={rss[0]:,.1f}M'
+		f' pool={rss[pool_mb]:,.1f}M [{rss[pool_mb] - rss[0]:+,.1f}M]' )
+
+
+def gen_corpus(path, sizes, formats, alpha_modes, count, seed_px=16):
+	'''Generates synthetic images with all combinations of specified parameters.
+		Images are random noise scaled up from 1/seed_px size,
+			to have somewhat realistic compression and decoding costs.'''
+	import gi
+	gi.require_version('GLib', '2.0')
+	gi.require_version('GdkPixbuf', '2.0')
+	from gi.repository import GdkPixbuf, GLib
+	path, n = pl.Path(path), 0
+	path.mkdir(parents=True, exist_ok=True)
+	save_opts = dict(jpeg=(['quality'], ['90']), png=(['compression'], ['6']))
+	for (w, h), fmt, alpha, k in it.product(sizes, formats, alpha_modes, range(count)):
+		if alpha and fmt == 'jpeg': continue
+		sw, sh, pn = max(1, w // seed_px), max(1, h // seed_px), 4 if alpha else 3
+		pb = GdkPixbuf.Pixbuf.new_from_bytes( GLib.Bytes.new(os.urandom(sw * sh * pn)),
+			GdkPixbuf.Colorspace.RGB, alpha, 8, sw, sh, sw * pn )
+		pb = pb.scale_simple(w, h, GdkPixbuf.InterpType.BILINEAR)
+		p = path / f'{w}x{h}.{"rgba" if alpha else "rgb"}.{k:03d}.{fmt.replace("jpeg", "jpg")}'
+		pb.savev(str(p), fmt, *save_opts.get(fmt, ([], [])))
+		print(p)
+		n += 1
+	print(f'Generated {n:,d} image(s) in: {path}')
+
+
+def bench_config(image_files, threads, w, h, interp, bk, duration, count):
+	'''Runs processing threads over images with specified parameters,
+		returning image count, wall time and list of per-image stage timestamps.'''
+	results, stop, files = list(), threading.Event(), it.cycle(image_files)
+	lock = threading.Lock()
+	def proc_thread():
+		while not stop.is_set():
+			with lock:
+				if count and len(results) >= count: break
+				path = next(files)
+			*_, st = pp.process_image_file(path, w, h, interp, *bk, 1, 0, True)
+			results.append(st)
+	ts0 = time.monotonic()
+	workers = list(threading.Thread(target=proc_thread, daemon=True) for n in range(threads))
+	for t in workers: t.start()
+	for t in workers:
+		t.join(max(0, duration - (time.monotonic() - ts0)) if duration else None)
+	stop.set()
+	for t in workers: t.join()
+	return len(results), time.monotonic() - ts0, results
+
+def bench_stats(results):
+	stages = dict()
+	for st in results:
+		for name, t0, t1 in st: stages.setdefault(name, list()).append((t1 - t0) / 1e3)
+	pct = lambda vs, k: vs[min(len(vs) - 1, int(len(vs) * k))]
+	for name, vs in stages.items():
+		vs.sort()
+		stages[name] = dict( mean=statistics.fmean(vs),
+			p50=pct(vs, 0.5), p95=pct(vs, 0.95), max=vs[-1] )
+	return stages
+
+def run_bench(image_files, threads_list, interp_list, brightness_list, w, h, duration, count):
+	res = dict(meta=dict(
+		module=pp.__name__, cpu_count=os.cpu_count(), host=os.uname().nodename,
+		date=dt.datetime.now().isoformat(timespec='seconds'),
+		images=len(image_files), size=f'{w}x{h}' ), results=list())
+	for threads, interp, bm in it.product(threads_list, interp_list, brightness_list):
+		n, td, results = bench_config( image_files, threads, w, h,
+			interp_types[interp], brightness_modes[bm], duration, count )
+		stages = bench_stats(results)
+		res['results'].append(dict(
+			threads=threads, interp=interp, brightness=bm,
+			images=n, time=td, rate=n / td, stages=stages ))
+		print( f'threads={threads:<3d} interp={interp:<8s} brightness={bm:<6s}'
+			f' images={n:<5,d} rate={n / td:,.1f}/s  ' + ' '.join(
+				f'{k}={v["p50"]:,.1f}/{v["p95"]:,.1f}ms' for k, v in stages.items() ), flush=True )
+	return res
+
+def bench_compare(baseline, res, threshold):
+	'''Prints differences between two bench results, returning number of regressions,
+		which are rate drops or p50 stage-time increases over threshold percent.'''
+	key = op.itemgetter('threads', 'interp', 'brightness')
+	base, regressions = dict((key(r), r) for r in baseline['results']), 0
+	print( f'Comparing results against baseline [{baseline["meta"]["date"]}]'
+		f' with {threshold:,.1f}% regression threshold:' )
+	for r in res['results']:
+		if not (b := base.get(key(r))):
+			print(f'  {key(r)}: not in baseline'); continue
+		diffs = [('rate', b['rate'], r['rate'], -1)] + list(
+			(f'{k}.p50', b['stages'][k]['p50'], v['p50'], 1)
+			for k, v in r['stages'].items() if k in b['stages'] )
+		for name, v0, v1, sign in diffs:
+			pct = (v1 - v0) / v0 * 100 if v0 else 0
+			if bad := pct * sign > threshold: regressions += 1
+			if bad or abs(pct) > threshold: print(
+				f'  {"REGRESSION" if bad else "improvement"} {key(r)}'
+				f' {name}: {v0:,.2f} -> {v1:,.2f} [{pct:+,.1f}%]' )
+	print(f'Regressions found: {regressions:,d}')
+	return regressions
+
 
 def main(args=None):
 	import argparse
 	parser = argparse.ArgumentParser(
-		description='Run pixbuf_proc.so processing on specified images in a loop.' )
-	parser.add_argument('image_file', nargs='+', help='Image file path(s) to loop over.')
-	parser.add_argument('-t', '--stop-after',
+		description='Run pixbuf_proc.so processing on images in a loop or benchmarks.' )
+	parser.add_argument('--py', action='store_true',
+		help='Use pure-python pixbuf_proc_py module instead of pixbuf_proc.so.')
+	cmds = parser.add_subparsers( title='Commands', dest='call',
+		description='Use "<cmd> -h" to see help for specific command.'
+			' Default is "loop", if first argument is not a command.' )
+
+	cmd = cmds.add_parser('loop', help='Process images in a loop, reporting resource usage.')
+	cmd.add_argument('image_file', nargs='+', help='Image file path(s) to loop over.')
+	cmd.add_argument('-t', '--stop-after',
 		type=float, metavar='seconds', default=120,
 		help='Seconds to stop the loop after. Default: %(default)s')
-	parser.add_argument('-r', '--report-interval',
+	cmd.add_argument('-r', '--report-interval',
 		type=float, metavar='seconds', default=10,
 		help='Interval in seconds between printing'
 			' processing and resource usage reports. Default: %(default)s')
-	opts = parser.parse_args(sys.argv[1:] if args is None else args)
+	cmd.add_argument('-p', '--pool-mb', type=float, metavar='MiB', default=0,
+		help='Size of pixbuf_proc.buffer_pool() to use, in MiB. Default: 0 (disabled)')
+	cmd.add_argument('-P', '--pool-compare', action='store_true',
+		help='Run loop in two subprocesses - without and with -p/--pool-mb'
+			' buffer pool (default: 256M if unset), and compare steady-state RSS of these.')
+
+	cmd = cmds.add_parser('corpus', help='Generate synthetic image corpus for benchmarks.')
+	cmd.add_argument('path', help='Directory to generate images in.')
+	cmd.add_argument('-s', '--sizes', metavar='WxH,...',
+		default='640x480,1920x1080,4000x3000,800x12000',
+		help='Comma-separated list of image sizes. Default: %(default)s')
+	cmd.add_argument('-f', '--formats', metavar='fmt,...', default='jpeg,png',
+		help='Comma-separated list of GdkPixbuf image formats. Default: %(default)s')
+	cmd.add_argument('-a', '--alpha', metavar='mode', default='both',
+		choices=['no', 'yes', 'both'], help='Generate images with/without alpha'
+			' channel (not for jpeg), or "both". Default: %(default)s')
+	cmd.add_argument('-n', '--count', type=int, metavar='n', default=2,
+		help='Number of images for each size/format/alpha combination. Default: %(default)s')
+
+	cmd = cmds.add_parser('bench', help='Run benchmarks with different processing parameters.')
+	cmd.add_argument('image_path', nargs='+', help='Image files or directories with these.')
+	cmd.add_argument('-t', '--threads', metavar='n,...',
+		default=','.join(map(str, sorted({1, max(1, os.cpu_count() // 2), os.cpu_count()}))),
+		help='Comma-separated thread counts to benchmark. Default: %(default)s')
+	cmd.add_argument('-z', '--interp', metavar='algo,...', default='bilinear',
+		help=f'Comma-separated interpolation algorithms - {", ".join(interp_types)}.'
+			' Default: %(default)s')
+	cmd.add_argument('-b', '--brightness', metavar='mode,...', default='none',
+		help=f'Comma-separated brightness modes - {", ".join(brightness_modes)}.'
+			' Default: %(default)s')
+	cmd.add_argument('-s', '--size', metavar='WxH', default='1920x-1',
+		help='Size to scale images to, -1 to keep aspect ratio. Default: %(default)s')
+	cmd.add_argument('-d', '--duration', type=float, metavar='seconds', default=10,
+		help='Time to run each benchmark configuration for. Default: %(default)ss')
+	cmd.add_argument('-n', '--count', type=int, metavar='n', default=0,
+		help='Stop each benchmark configuration after n images. Default: no limit')
+	cmd.add_argument('-o', '--output', metavar='file',
+		help='JSON file to store results in, e.g. to use as a baseline later.')
+	cmd.add_argument('-c', '--compare', metavar='file',
+		help='JSON baseline file to compare results against, flagging regressions.')
+	cmd.add_argument('-r', '--regression-threshold', type=float, metavar='%', default=10,
+		help='Percent difference from baseline to flag as a regression. Default: %(default)s%%')
+
+	cmd = cmds.add_parser('compare',
+		help='Compare two JSON results of "bench" command, flagging regressions.')
+	cmd.add_argument('baseline', help='JSON file with baseline results.')
+	cmd.add_argument('results', help='JSON file with new results.')
+	cmd.add_argument('-r', '--regression-threshold', type=float, metavar='%', default=10,
+		help='Percent difference from baseline to flag as a regression. Default: %(default)s%%')
+
+	args = sys.argv[1:] if args is None else list(args)
+	if (a := next((a for a in args if a != '--py'), None)) \
+			and a not in cmds.choices and a not in ['-h', '--help']:
+		args.insert(args.index(a), 'loop') # backwards-compatible default command
+	opts = parser.parse_args(args)
+	if not opts.call: parser.error('Command must be specified')
+
+	global pp
+	if opts.call in ['loop', 'bench']:
+		if opts.py: import pixbuf_proc_py as pp
+		else: import pixbuf_proc as pp
+
+	if opts.call == 'loop':
+		if opts.pool_compare:
+			args = list(a for a in args[args.index('loop')+1:] if a not in ['-P', '--pool-compare'])
+			if opts.py: args.insert(0, '--py') # must be before command
+			return run_pool_compare(args, opts.pool_mb or 256)
+		run_proc_loop(opts.image_file, opts.stop_after, opts.report_interval, opts.pool_mb)
+
+	elif opts.call == 'corpus':
+		sizes = list(tuple(map(int, sz.split('x', 1))) for sz in opts.sizes.split(','))
+		alpha = dict(no=[False], yes=[True], both=[False, True])[opts.alpha]
+		gen_corpus(opts.path, sizes, opts.formats.split(','), alpha, opts.count)
+
+	elif opts.call == 'bench':
+		image_files = list()
+		for p in map(pl.Path, opts.image_path):
+			if not p.is_dir(): image_files.append(str(p)); continue
+			image_files.extend(sorted(str(p) for p in p.rglob('*') if p.is_file()))
+		if not image_files: parser.error('No image files found')
+		threads = list(map(int, opts.threads.split(',')))
+		interp, brightness = opts.interp.split(','), opts.brightness.split(',')
+		for v, vs in (interp, interp_types), (brightness, brightness_modes):
+			if unknown := set(v).difference(vs): parser.error(f'Unknown values: {unknown}')
+		w, h = map(int, opts.size.split('x', 1))
+		if hasattr(pp, 'workers'): pp.workers = max(threads)
+		res = run_bench( image_files, threads, interp,
+			brightness, w, h, opts.duration, opts.count )
+		if opts.output: pl.Path(opts.output).write_text(json.dumps(res, indent=2) + '\n')
+		if opts.compare:
+			baseline = json.loads(pl.Path(opts.compare).read_text())
+			if bench_compare(baseline, res, opts.regression_threshold): return 1
 
-	run_proc_loop(opts.image_file, opts.stop_after, opts.report_interval)
+	elif opts.call == 'compare':
+		baseline, res = (
+			json.loads(pl.Path(p).read_text()) for p in [opts.baseline, opts.results] )
+		if bench_compare(baseline, res, opts.regression_threshold): return 1
 
 if __name__ == '__main__': sys.exit(main())
@@ -0,0 +1,256 @@
+'''
+Pure-python fallback for pixbuf_proc.so module, with same process_image_file() API.
+
+Loads and scales images via GdkPixbuf in a pool of worker processes,
+returning pixel data from these through shared memory segments.
+Same as C module, process_image_file() can be called from background threads,
+which will only be blocked waiting on the result without holding python GIL.
+
+Brightness adjustments use numpy, if it's available,
+vectorized over arrays of pixels, with same results as C code (within +/-1).
+
+Usage:
+  import pixbuf_proc_py as pixbuf_proc
+  pixbuf_proc.workers = 4 # optional, default - os.cpu_count()
+  pixbuf_proc.worker_priority = 10, '7', {2, 3} # optional nice, ioprio, CPU affinity
+  buff, w, h, rs, alpha = pixbuf_proc\\
+    .process_image_file(path, max_w, max_h, scale_interp, brightness-opts...)
+  # or .process_image_bytes(image_file_bytes, ...) with same other args
+'''
+
+import os, time, threading, multiprocessing as mp, concurrent.futures as cf
+from multiprocessing import shared_memory
+
+try: import numpy as np
+except ImportError: np = None
+
+
+class error(Exception): pass
+
+workers = 0 # process pool size, 0 - os.cpu_count()
+worker_priority = None # (nice, ioprio, cpus) - see _worker_init()
+has_brightness = bool(np) # -b/-B options require numpy here
+has_preview = False # process_image_bytes() preview callback is not supported
+
+_pool, _pool_lock = None, threading.Lock()
+
+def _pool_get():
+	global _pool
+	if not _pool:
+		with _pool_lock:
+			if not _pool: _pool = cf.ProcessPoolExecutor(
+				workers or os.cpu_count(), mp_context=mp.get_context('forkserver'),
+				initializer=_worker_init, initargs=worker_priority or () )
+	return _pool
+
+def _worker_init(nice=0, ioprio='', cpus=None):
+	'''Lowers CPU/IO priority and sets CPU affinity for worker process.
+		ioprio is best-effort class level ("0"-"7") or "idle", same as in main script.'''
+	try:
+		if nice: os.nice(nice)
+		if cpus: os.sched_setaffinity(0, cpus)
+	except OSError: pass
+	if not ioprio: return
+	import ctypes, platform
+	sys_n = dict(x86_64=251, i686=289, armv7l=314).get(platform.machine(), 30) # 30 - asm-generic
+	ioprio = (3 << 13) if ioprio == 'idle' else ((2 << 13) | int(ioprio)) # IOPRIO_CLASS_IDLE/BE
+	ctypes.CDLL(None).syscall(sys_n, 1, 0, ioprio) # IOPRIO_WHO_PROCESS, errors are ignored
+
+def _pool_drop(pool):
+	'Discards broken process pool, so that new one is started on next call.'
+	global _pool
+	with _pool_lock:
+		if _pool is pool: _pool = None
+	pool.shutdown(wait=False, cancel_futures=True)
+
+def _shm_create(size):
+	try: return shared_memory.SharedMemory(create=True, size=size, track=False)
+	except TypeError: pass # python <3.13 - unregister it from worker resource_tracker
+	from multiprocessing import resource_tracker
+	shm = shared_memory.SharedMemory(create=True, size=size)
+	resource_tracker.unregister(shm._name, 'shared_memory')
+	return shm
+
+
+# RGB<->HSP code from http://alienryderflex.com/hsp.html
+# Same float64 operations as in pixbuf_proc.c, but on arrays of pixel values
+
+_hsp_w = .299, .587, .114 # Pr, Pg, Pb
+
+# (direction, base, big/mid/small channel index) for each 1/6 of hue range
+_hsp_sectors = [
+	(1, 0/6, (0, 1, 2)), (-1, 2/6, (1, 0, 2)), (1, 2/6, (1, 2, 0)),
+	(-1, 4/6, (2, 1, 0)), (1, 4/6, (2, 0, 1)), (-1, 6/6, (0, 2, 1)) ]
+
+def _rgb_to_hsp(r, g, b):
+	p = np.sqrt(r*r*_hsp_w[0] + g*g*_hsp_w[1] + b*b*_hsp_w[2])
+	h, s = np.zeros_like(p), np.zeros_like(p)
+	gray = (r == g) & (r == b)
+	r_max = ~gray & (r >= g) & (r >= b)
+	g_max = ~gray & ~r_max & (g >= r) & (g >= b)
+	b_max = ~(gray | r_max | g_max)
+	for m, hs_func in [
+			(r_max & (b >= g), lambda r, g, b: (6/6 - 1/6*(b-g)/(r-g), 1 - g/r)),
+			(r_max & (b < g), lambda r, g, b: (0/6 + 1/6*(g-b)/(r-b), 1 - b/r)),
+			(g_max & (r >= b), lambda r, g, b: (2/6 - 1/6*(r-b)/(g-b), 1 - b/g)),
+			(g_max & (r < b), lambda r, g, b: (2/6 + 1/6*(b-r)/(g-r), 1 - r/g)),
+			(b_max & (g >= r), lambda r, g, b: (4/6 - 1/6*(g-r)/(b-r), 1 - r/b)),
+			(b_max & (g < r), lambda r, g, b: (4/6 + 1/6*(r-g)/(b-g), 1 - g/b)) ]:
+		if m.any(): h[m], s[m] = hs_func(r[m], g[m], b[m])
+	return h, s, p
+
+def _hsp_to_rgb(h, s, p):
+	'Returns uint8 array of RGB values, clamped and truncated same as in C.'
+	rgb, mom = np.empty(h.shape + (3,)), 1 - s
+	sector = np.zeros(h.shape, np.int8)
+	for n in range(1, 6): sector += h >= n/6
+	for n, (d, base, (cb, cm, cs)) in enumerate(_hsp_sectors):
+		if not (m := sector == n).any(): continue
+		hm, pm, mm = h[m], p[m], mom[m]
+		hm = 6*(hm - base) if d > 0 else 6*(-hm + base)
+		wb, wm, ws = _hsp_w[cb], _hsp_w[cm], _hsp_w[cs]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			part = 1 + hm*(1/mm - 1)
+			small = pm/np.sqrt(wb/mm/mm + wm*part*part + ws)
+			big = small/mm
+			mid = small + hm*(big - small)
+			big0 = np.sqrt(pm*pm/(wb + wm*hm*hm)) # minOverMax=0
+		m0 = mm <= 0
+		rgb[m, cb] = np.where(m0, big0, big)
+		rgb[m, cm] = np.where(m0, big0*hm, mid)
+		rgb[m, cs] = np.where(m0, 0, small)
+	rgb = np.where(rgb <= 255, rgb, 255) # RGB_clamp, incl. NaNs
+	return np.maximum(rgb, 0).astype(np.uint8)
+
+def _brightness_adapt_k(px, ad, ak):
+	'Calcs median (average) of up to 1000 evenly-sampled pixels, same as in C module.'
+	h, w = px.shape[:2]
+	n = np.arange(0, w * h, max(1, w * h // 1000))[:1000]
+	rgb = px[n // w, n % w, :3].astype(np.float64)
+	pks = np.sort(_rgb_to_hsp(rgb[:, 0], rgb[:, 1], rgb[:, 2])[2] / 255)
+	if (pk := pks[len(pks) // 2]) <= 0: return 0
+	return ak / pk if ( ad == 1 # both
+		or (ad == 2 and pk < ak) # up
+		or (ad == 3 and pk > ak) ) else 0 # down
+
+def _brightness(px, k, ad, ak, chunk=2**18):
+	'In-place HSP brightness adjustment for (h, w, n) uint8 array, in chunks of rows.'
+	if k == 1.0 and ak <= 0: return
+	if ak > 0: ak = _brightness_adapt_k(px, ad, ak)
+	h, w = px.shape[:2]
+	for y in range(0, h, c := max(1, chunk // w)):
+		rgb = px[y:y+c, :, :3].astype(np.float64)
+		hh, s, p = _rgb_to_hsp(rgb[..., 0], rgb[..., 1], rgb[..., 2])
+		if ak: p *= ak
+		p *= k
+		px[y:y+c, :, :3] = _hsp_to_rgb(hh, s, p)
+
+def _pixbuf_array(pb):
+	'Returns writable copy of pixbuf pixels and (h, w, n) array view into it.'
+	w, h, rs, n = pb.get_width(), pb.get_height(), pb.get_rowstride(), pb.get_n_channels()
+	buff, data = bytearray(h * rs), pb.read_pixel_bytes().get_data()
+	buff[:len(data)] = data
+	return buff, np.frombuffer(buff, np.uint8).reshape(h, rs)[:, :w*n].reshape(h, w, n)
+
+
+class _Stages(list):
+	'List of (stage, t0_us, t1_us) timestamps, same as returned by C module.'
+	def __call__(self, name):
+		self.append([name, time.monotonic_ns() // 1000, None])
+		return self
+	def __enter__(self): return self
+	def __exit__(self, *err): self[-1][2] = time.monotonic_ns() // 1000
+
+def _process_image(src, w, h, scale_interp, brightness_k, brightness_ad, brightness_ak):
+	'''Runs in worker process, with src being either file path or image file bytes.
+		Returns shm name, pixbuf parameters and stage timestamps.'''
+	import gi
+	gi.require_version('GLib', '2.0')
+	gi.require_version('GdkPixbuf', '2.0')
+	from gi.repository import GdkPixbuf, GLib
+
+	st = _Stages()
+	try:
+		with st('load'):
+			if isinstance(src, str): pb = GdkPixbuf.Pixbuf.new_from_file(src)
+			else:
+				loader = GdkPixbuf.PixbufLoader()
+				loader.write(src)
+				loader.close()
+				if not (pb := loader.get_pixbuf()): raise error('No image data in a buffer')
+	except GLib.Error as err: raise error(f'GdkPixbuf image load error - {err.message}') from None
+	pb_w, pb_h = pb.get_width(), pb.get_height()
+	if w <= 0 and h <= 0: w, h = pb_w, pb_h
+	elif w <= 0: w = int(pb_w * h / pb_h)
+	elif h <= 0: h = int(pb_h * w / pb_w)
+	bk = brightness_k, brightness_ad, brightness_ak
+	bk = bk if brightness_k != 1.0 or brightness_ak > 0 else None
+	if bk and pb_w * pb_h > w * h: # rescale after pixel processing
+		with st('brightness'):
+			buff, px = _pixbuf_array(pb)
+			_brightness(px, *bk)
+			pb = GdkPixbuf.Pixbuf.new_from_bytes( GLib.Bytes.new(bytes(buff)),
+				GdkPixbuf.Colorspace.RGB, pb.get_has_alpha(), 8, pb_w, pb_h, pb.get_rowstride() )
+		bk = None
+	if (pb_w, pb_h) != (w, h):
+		with st('scale'): pb = pb.scale_simple(w, h, GdkPixbuf.InterpType(scale_interp))
+		if not pb: raise error('GdkPixbuf scaling error')
+	if not bk: buff = pb.read_pixel_bytes().get_data()
+	else:
+		with st('brightness'):
+			buff, px = _pixbuf_array(pb)
+			_brightness(px, *bk)
+
+	shm = _shm_create(len(buff))
+	try: shm.buf[:len(buff)] = buff
+	finally: shm.close()
+	return shm.name, len(buff), w, h, pb.get_rowstride(), pb.get_has_alpha(), st
+
+
+def process_image_file( path, w, h, scale_interp, brightness_k=1.0,
+		brightness_ad=0, brightness_ak=0, bands=1, band_px=0, timings=False ):
+	'''Load image and scale/process it in a worker process.
+		Returns (buff, w, h, rs, alpha[, stages]) tuple, same as C module.'''
+	return _process( path, w, h, scale_interp,
+		brightness_k, brightness_ad, brightness_ak, timings )
+
+def process_image_bytes( buff, w, h, scale_interp, brightness_k=1.0,
+		brightness_ad=0, brightness_ak=0, bands=1, band_px=0, timings=False,
+		preview=None, preview_delay=0 ):
+	'''Same as process_image_file(), but decodes image from bytes-like buffer.
+		preview callback is accepted for compatibility, but never called.'''
+	return _process( bytes(buff), w, h, scale_interp,
+		brightness_k, brightness_ad, brightness_ak, timings )
+
+def _process(src, w, h, scale_interp, brightness_k, brightness_ad, brightness_ak, timings):
+	if brightness_k < 0: raise ValueError(f'Brightness cannot be negative: {brightness_k}')
+	if not np and (brightness_k != 1.0 or brightness_ak > 0):
+		raise error('Brightness adjustments require numpy module')
+	pool = _pool_get()
+	try:
+		shm_name, n, w, h, rs, alpha, st = pool.submit( _process_image,
+			src, w, h, scale_interp, brightness_k, brightness_ad, brightness_ak ).result()
+	except cf.process.BrokenProcessPool as err: # e.g. worker was OOM-killed
+		_pool_drop(pool)
+		raise error(f'Worker process failed - {err}') from None
+	shm = shared_memory.SharedMemory(shm_name)
+	try:
+		with st('export'), shm.buf[:n] as buff: buff = bytes(buff)
+	finally: shm.close(); shm.unlink()
+	if not timings: return buff, w, h, rs, alpha
+	return buff, w, h, rs, alpha, tuple(map(tuple, st))
+
+def set_band_threads(n):
+	'No-op, for compatibility with C module - each image is processed in one worker process.'
+
+def buffer_pool(max_bytes):
+	'No-op, for compatibility with C module - pixel buffers are not pooled here.'
+
+def buffer_pool_trim():
+	'Returns free heap memory to OS via malloc_trim(), if it is available.'
+	import ctypes, ctypes.util
+	try: ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim(0)
+	except (OSError, AttributeError, TypeError): pass
+	return 0
+
+def buffer_pool_stats(): return 0, 0, 0
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+import os, sys, time, subprocess, statistics, json, resource, atexit, tempfile
+import importlib.util, datetime as dt, pathlib as pl
+
+
+class BenchStats:
+
+	def __init__(self, warmup):
+		self.ts0, self.warmup = time.monotonic(), warmup
+		self.frames, self.frame_last = list(), None # (interval_ms, gap_px)
+		self.first_image = None
+		self.latency_add, self.latency_ready, self.image_cycle = list(), list(), list()
+		self.main_cbs = list() # set_pixbufs/thread_cb durations in main thread
+		self.rusage0 = self.rss0 = None
+
+	def warm(self): return time.monotonic() - self.ts0 >= self.warmup
+
+	def frame(self, ts_us, gap_px, gap_win):
+		if self.frame_last and self.warm():
+			self.frames.append(((ts_us - self.frame_last) / 1e3, gap_px / gap_win))
+		self.frame_last = ts_us
+		if self.rusage0 is None and self.warm():
+			self.rusage0, self.rss0 = resource.getrusage(resource.RUSAGE_SELF), get_rss()
+
+	def report(self, duration, scroll_auto):
+		pct = lambda vs, k: vs[min(len(vs) - 1, int(len(vs) * k))] if vs else 0
+		pcts = lambda vs: dict(
+			(k, pct(vs, n)) for k, n in [('p50', .5), ('p95', .95), ('p99', .99), ('max', 1)] )
+		frames = sorted(td for td, gap in self.frames)
+		frame_p50 = pct(frames, .5)
+		ru, ru0 = resource.getrusage(resource.RUSAGE_SELF), self.rusage0
+		cpu_time = (ru.ru_utime - ru0.ru_utime) + (ru.ru_stime - ru0.ru_stime) if ru0 else 0
+		time_bench = max(1e-6, duration - self.warmup)
+		return dict(
+			meta=dict( date=dt.datetime.now().isoformat(timespec='seconds'),
+				duration=duration, warmup=self.warmup, scroll_auto=scroll_auto ),
+			frames=len(frames), fps=len(frames) / time_bench,
+			frame_ms=dict(mean=statistics.fmean(frames) if frames else 0, **pcts(frames)),
+			frames_slow=sum(td > frame_p50 * 1.5 for td in frames),
+			gap_time=sum(td for td, gap in self.frames if gap > 0) / 1e3,
+			gap_frac_mean=statistics.fmean(gap for td, gap in self.frames) if frames else 0,
+			first_image_ms=self.first_image,
+			add_to_display_ms=pcts(sorted(self.latency_add)),
+			ready_to_display_ms=pcts(sorted(self.latency_ready)),
+			image_cycle_ms=pcts(sorted(self.image_cycle)),
+			main_cbs_ms=pcts(sorted(self.main_cbs)),
+			cpu=cpu_time / time_bench, rss_mb=get_rss() / 2**20,
+			rss_growth_mb=(get_rss() - (self.rss0 or 0)) / 2**20 )
+
+
+def get_rss():
+	with open('/proc/self/statm') as src:
+		return int(src.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def run_xvfb(w, h):
+	'Starts Xvfb on a free display number and sets DISPLAY env for it.'
+	r, w_fd = os.pipe()
+	proc = subprocess.Popen( [ 'Xvfb', '-displayfd', str(w_fd),
+		'-screen', '0', f'{w}x{h}x24', '-nolisten', 'tcp' ], pass_fds=[w_fd] )
+	os.close(w_fd)
+	with open(r) as src: n = src.readline().strip()
+	if not n: raise RuntimeError(f'Failed to start Xvfb [exit={proc.wait()}]')
+	atexit.register(lambda: (proc.terminate(), proc.wait()))
+	os.environ.update(DISPLAY=f':{n}', GDK_BACKEND='x11')
+
+def load_scroller():
+	p = pl.Path(__file__).resolve().parent / 'infinite-image-scroller.py'
+	spec = importlib.util.spec_from_file_location('infinite_image_scroller', p)
+	mod = sys.modules[spec.name] = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(mod) # needs to be in sys.modules for dataclass annotations
+	return mod
+
+def bench_window_class(scroller, stats, duration):
+
+	scroller.gtk_import() # for ScrollerWindow to be defined
+	class BenchWindow(scroller.ScrollerWindow):
+
+		def init_widgets(self):
+			super().init_widgets()
+			self.connect('realize', self.bench_init)
+			scroller.GLib.timeout_add(duration * 1000, self.app.quit)
+
+		def bench_init(self, w):
+			self.get_frame_clock().connect('after-paint', self.bench_frame)
+
+		def bench_frame(self, clock):
+			ts, sz_win = time.monotonic(), getattr(self.scroll.get_allocation(), self.dim_scroll)
+			covered = 0
+			for image in self.box_images:
+				if image.displayed and (t := getattr(image, 'bench_t_add', None)):
+					if not stats.first_image: stats.first_image = (ts - stats.ts0) * 1e3
+					if stats.warm():
+						stats.latency_add.append((ts - t) * 1e3)
+						if t := getattr(image, 'bench_t_ready', None):
+							stats.latency_ready.append((ts - t) * 1e3)
+					image.bench_t_add = None
+				if not (image.displayed and image.sz_scroll): continue
+				if not (o := image.gtk.translate_coordinates(self.scroll, 0, 0)): continue
+				o = o[self.dim_scroll_n]
+				o0, o1 = max(0, o), min(sz_win, o + image.sz_scroll + self.conf.misc_box_spacing)
+				covered += max(0, o1 - o0)
+			stats.frame(clock.get_frame_time(), max(0, sz_win - covered), sz_win or 1)
+
+		def image_load(self, path):
+			if image := super().image_load(path): image.bench_t_add = time.monotonic()
+			return image
+
+		def image_set_pixbuf_proc(self, image):
+			super().image_set_pixbuf_proc(image)
+			image.bench_t_ready = time.monotonic()
+
+		def image_cycle(self):
+			ts = time.monotonic()
+			try: return super().image_cycle()
+			finally:
+				if stats.warm(): stats.image_cycle.append((time.monotonic() - ts) * 1e3)
+
+		def image_set_pixbufs(self, *args, **kws):
+			ts = time.monotonic()
+			try: return super().image_set_pixbufs(*args, **kws)
+			finally:
+				if stats.warm(): stats.main_cbs.append((time.monotonic() - ts) * 1e3)
+
+		def image_set_pixbuf_thread_cb(self):
+			ts = time.monotonic()
+			try: return super().image_set_pixbuf_thread_cb()
+			finally:
+				if stats.warm(): stats.main_cbs.append((time.monotonic() - ts) * 1e3)
+
+	return BenchWindow
+
+
+def main(args=None):
+	import argparse
+	parser = argparse.ArgumentParser(
+		description='Run infinite-image-scroller window with auto-scrolling'
+			' for a fixed amount of time, measuring frame times, image loading'
+			' latencies and such, to catch scroll-smoothness regressions.'
+			' Any args after "--" are passed to infinite-image-scroller.py script as-is.' )
+	parser.add_argument('image_path', nargs='*', help='Image files or directories'
+		' to scroll through, looped. Default is to generate corpus in a temp dir.')
+	parser.add_argument('-t', '--time', type=float, metavar='seconds', default=30,
+		help='Time to run benchmark for, including warmup. Default: %(default)ss')
+	parser.add_argument('-w', '--warmup', type=float, metavar='seconds', default=3,
+		help='Initial time to not count towards frame'
+			' and other stats, except time-to-first-image. Default: %(default)ss')
+	parser.add_argument('-a', '--auto-scroll', metavar='px[:interval]', default='8:0.016',
+		help='Auto-scroll speed, same as -a/--auto-scroll option in the script.'
+			' Default: %(default)s')
+	parser.add_argument('-s', '--size', metavar='WxH', default='1280x1024',
+		help='Window (and Xvfb screen) size. Default: %(default)s')
+	parser.add_argument('-x', '--xvfb', action='store_true',
+		help='Start Xvfb and run window on it, instead of using current DISPLAY.'
+			' Other GDK backends can be used via env, e.g. GDK_BACKEND=broadway.')
+	parser.add_argument('-c', '--corpus', metavar='dir',
+		help='Directory to generate/reuse synthetic image corpus in, if no paths are specified.')
+	parser.add_argument('-o', '--output', metavar='file',
+		help='JSON file to store results in. Results are always printed to stdout.')
+	args = sys.argv[1:] if args is None else list(args)
+	try: n = args.index('--')
+	except ValueError: args_scroller = list()
+	else: args, args_scroller = args[:n], args[n+1:]
+	opts = parser.parse_args(args)
+
+	w, h = map(int, opts.size.split('x', 1))
+	if opts.xvfb: run_xvfb(w, h)
+
+	image_paths = opts.image_path
+	if not image_paths:
+		corpus = opts.corpus or tempfile.mkdtemp(prefix='scroller-bench.')
+		if not opts.corpus:
+			import shutil
+			atexit.register(shutil.rmtree, corpus, ignore_errors=True)
+		(corpus := pl.Path(corpus)).mkdir(parents=True, exist_ok=True)
+		if not any(corpus.iterdir()):
+			sys.path.insert(0, str(pl.Path(__file__).resolve().parent))
+			import pixbuf_proc_loop
+			pixbuf_proc_loop.gen_corpus( corpus,
+				[(640, 480), (1920, 1080), (4000, 3000), (800, 12000)],
+				['jpeg', 'png'], [False, True], 3 )
+		image_paths = [str(corpus)]
+
+	scroller = load_scroller()
+	stats = BenchStats(opts.warmup)
+	scroller.ScrollerWindow = bench_window_class(scroller, stats, opts.time)
+	ts = time.monotonic()
+	scroller.main([ '--loop', '--no-register-session', '-a', opts.auto_scroll,
+		'-p', f'{w}x{h}+0+0', *args_scroller, '--', *image_paths ])
+	res = stats.report(time.monotonic() - ts, opts.auto_scroll)
+
+	print(json.dumps(res, indent=2))
+	if opts.output: pl.Path(opts.output).write_text(json.dumps(res, indent=2) + '\n')
+
+if __name__ == '__main__': sys.exit(main())